@@ -0,0 +1,442 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from profiling import stage
+from sketches import APPROXIMATE_DEFAULTS, group_sketches, merge_sketches, sketch_result
+
+AGE_BINS = [0, 25, 35, 45, 55, 100]
+AGE_LABELS = ['18-25', '26-35', '36-45', '46-55', '55+']
+
+# Fixed bin edges, so distribution counts merge across chunks, shards and updates
+RATING_BIN_EDGES = np.linspace(0, 5, 11)
+DURATION_BIN_WIDTH = 10
+
+# Each section of analyze_restaurant_data as (group key, pandas-style agg spec).
+# A key of None aggregates the whole table into a single row.
+ORDER_SECTIONS = {
+    'order_analysis': ('Order Status', {
+        'Order ID': 'count',
+        'Amount (USD)': ['sum', 'mean', 'median'],
+        'Rating': ['mean', 'count']
+    }),
+    'meal_analysis': ('Meal Type_x', {
+        'Order ID': 'count',
+        'Amount (USD)': ['sum', 'mean'],
+        'Rating': 'mean'
+    }),
+    'time_analysis': ('Time of Day', {
+        'Order ID': 'count',
+        'Amount (USD)': ['mean', 'sum'],
+        'Rating': 'mean'
+    }),
+    'dish_analysis': ('Dish Name_x', {
+        'Order ID': 'count',
+        'Amount (USD)': ['sum', 'mean'],
+        'Rating': ['mean', 'count']
+    }),
+    # Additive hourly totals that rollups.py coarsens into daily, weekly and monthly series
+    'hourly_revenue': ('Order_Hour', {
+        'Order ID': 'count',
+        'Amount (USD)': 'sum',
+        'Rating': ['sum', 'count']
+    }),
+}
+
+SESSION_SECTIONS = {
+    'age_analysis': ('Age_Group', {
+        'User ID': 'count',
+        'Total Orders': 'mean',
+        'Session Rating': 'mean',
+        'Duration (mins)': 'mean'
+    }),
+    'location_metrics': ('Location', {
+        'User ID': 'nunique',
+        'Total Orders': ['sum', 'mean'],
+        'Session Rating': 'mean'
+    }),
+    'session_metrics': (None, {
+        'Duration (mins)': ['mean', 'median'],
+        'Session Rating': 'mean',
+        'User ID': 'nunique',
+        'Total Orders': 'mean'
+    }),
+    'rating_distribution': ('Rating_Bin', {'Session Rating': 'count'}),
+    'duration_rating_distribution': ('Duration_Rating_Bin', {'Session Rating': 'count'}),
+}
+
+# Order in which analyze_restaurant_data reports its sections
+SECTION_ORDER = (
+    'order_analysis', 'age_analysis', 'location_metrics', 'meal_analysis',
+    'time_analysis', 'session_metrics', 'dish_analysis',
+    'rating_distribution', 'duration_rating_distribution', 'hourly_revenue'
+)
+
+# Sections finalized without rounding, because rollups.py adds their totals up further
+ADDITIVE_SECTIONS = ('hourly_revenue',)
+
+# session_metrics is reported as a flat dict of named scalars
+SESSION_METRICS = {
+    'Avg Session Duration': ('Duration (mins)', 'mean'),
+    'Median Session Duration': ('Duration (mins)', 'median'),
+    'Avg Session Rating': ('Session Rating', 'mean'),
+    'Total Unique Users': ('User ID', 'nunique'),
+    'Avg Orders per User': ('Total Orders', 'mean'),
+}
+
+# Statistics derived from running sums, sums of squares, or value distributions
+SUM_STATS = ('sum', 'mean', 'std', 'var')
+SQUARE_STATS = ('std', 'var')
+VALUE_STATS = ('median', 'nunique')
+
+
+def add_age_group(user_sessions):
+    """
+    Bucket user ages into the Age_Group column used by the customer analysis
+    """
+    user_sessions['Age_Group'] = pd.cut(
+        user_sessions['Age'],
+        bins=AGE_BINS,
+        labels=AGE_LABELS
+    )
+    return user_sessions
+
+
+def _codes_from_bins(bins):
+    """
+    Group codes over the non-empty bins (-1 for missing) and the sorted bin numbers.
+
+    Bin numbers are small non-negative integers, so a bincount over their range
+    finds the non-empty ones without sorting the rows.
+    """
+    present = bins >= 0
+    span = int(bins.max()) + 1 if present.any() else 0
+    if span > 4 * len(bins) + 1024:
+        uniques = np.unique(bins[present])
+        codes = np.searchsorted(uniques, bins).astype(np.intp)
+        codes[~present] = -1
+        return codes, uniques
+    uniques = np.flatnonzero(np.bincount(bins[present], minlength=span))
+    lookup = np.full(span + 1, -1, dtype=np.intp)
+    lookup[uniques] = np.arange(len(uniques))
+    return lookup[np.where(present, bins, span)], uniques
+
+
+def _rating_bins(frame):
+    ratings = frame['Session Rating'].to_numpy(dtype=float, na_value=np.nan)
+    bins = np.searchsorted(RATING_BIN_EDGES, ratings, side='right') - 1
+    return np.where(np.isnan(ratings), -1, np.clip(bins, 0, len(RATING_BIN_EDGES) - 2))
+
+
+def _duration_bins(frame):
+    durations = frame['Duration (mins)'].to_numpy(dtype=float, na_value=np.nan)
+    bins = np.floor(np.clip(np.nan_to_num(durations, nan=0.0), 0, None) / DURATION_BIN_WIDTH)
+    return np.where(np.isnan(durations), -1, bins).astype(np.int64)
+
+
+def rating_bin_key(frame):
+    """
+    Session Rating binned on RATING_BIN_EDGES, labelled by each bin's lower edge
+    """
+    codes, uniques = _codes_from_bins(_rating_bins(frame))
+    return codes, pd.Index(RATING_BIN_EDGES[uniques], name='Rating_Bin')
+
+
+def age_group_key(frame):
+    """
+    Ages bucketed into AGE_LABELS, without adding an Age_Group column to the frame.
+    Every label is kept, so empty age groups still get a row (count 0) like the groupby did.
+    """
+    age_groups = pd.cut(frame['Age'], bins=AGE_BINS, labels=AGE_LABELS)
+    codes = np.asarray(age_groups.cat.codes, dtype=np.intp)
+    return codes, pd.CategoricalIndex(AGE_LABELS, categories=AGE_LABELS, ordered=True, name='Age_Group')
+
+
+def duration_rating_bin_key(frame):
+    """
+    Duration (mins) x Session Rating grid cells, labelled by (duration, rating) lower edges
+    """
+    ratings = _rating_bins(frame)
+    durations = _duration_bins(frame)
+    per_row = len(RATING_BIN_EDGES) - 1
+    cells = np.where((ratings >= 0) & (durations >= 0), durations * per_row + ratings, -1)
+    codes, uniques = _codes_from_bins(cells)
+    labels = pd.MultiIndex.from_arrays(
+        [(uniques // per_row) * float(DURATION_BIN_WIDTH), RATING_BIN_EDGES[uniques % per_row]],
+        names=['Duration_Bin', 'Rating_Bin']
+    )
+    return codes, labels
+
+
+def order_hour_key(frame):
+    """
+    Order Date floored to the hour, labelled by the start of each non-empty hour
+    """
+    dates = frame['Order Date']
+    if getattr(dates.dtype, 'tz', None) is not None:
+        dates = dates.dt.tz_localize(None)
+    hours = dates.to_numpy(dtype='datetime64[h]').astype(np.int64)
+    present = dates.notna().to_numpy()
+    origin = hours[present].min() if present.any() else 0
+    codes, uniques = _codes_from_bins(np.where(present, hours - origin, -1))
+    labels = (uniques + origin).astype('datetime64[h]').astype('datetime64[us]')
+    return codes, pd.DatetimeIndex(labels, name='Order_Hour')
+
+
+# Keys computed from other columns while aggregating, as (source columns, key function)
+DERIVED_KEYS = {
+    'Age_Group': (('Age',), age_group_key),
+    'Rating_Bin': (('Session Rating',), rating_bin_key),
+    'Duration_Rating_Bin': (('Duration (mins)', 'Session Rating'), duration_rating_bin_key),
+    'Order_Hour': (('Order Date',), order_hour_key),
+}
+
+
+def section_columns(sections):
+    """
+    Every column a set of sections reads: group keys and aggregated columns
+    """
+    columns = []
+    for key, spec in sections.values():
+        if key in DERIVED_KEYS:
+            keys = list(DERIVED_KEYS[key][0])
+        else:
+            keys = [key] if key is not None else []
+        for column in keys + list(spec):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def _stat_list(stats):
+    return [stats] if isinstance(stats, str) else list(stats)
+
+
+def factorize_key(frame, key):
+    """
+    Integer group codes (-1 for missing) and sorted group labels for a key column
+    """
+    if key is None:
+        codes = np.zeros(len(frame), dtype=np.intp)
+        return codes, pd.Index([0])
+    if key in DERIVED_KEYS:
+        return DERIVED_KEYS[key][1](frame)
+    codes, uniques = pd.factorize(frame[key], sort=True)
+    return codes, pd.Index(uniques, name=key)
+
+
+def _value_counts(codes, labels, value_codes, value_labels):
+    """
+    (group, value) -> count Series from group codes and value codes
+    """
+    valid = (codes >= 0) & (value_codes >= 0)
+    pairs = codes[valid].astype(np.int64) * len(value_labels) + value_codes[valid]
+    pairs, counts = np.unique(pairs, return_counts=True)
+    index = pd.MultiIndex(
+        levels=[labels, value_labels],
+        codes=[pairs // len(value_labels), pairs % len(value_labels)],
+        verify_integrity=False
+    )
+    return pd.Series(counts, index=index)
+
+
+def approximate_options(approximate):
+    """
+    Sketch settings for an `approximate` argument: False/None, True, or a dict of overrides
+    """
+    if not approximate:
+        return None
+    return {**APPROXIMATE_DEFAULTS, **(approximate if isinstance(approximate, dict) else {})}
+
+
+def aggregate_sections(frame, sections, squares=False, approximate=None):
+    """
+    Partial aggregates for several sections of one table in a single vectorized pass.
+
+    Each key column is factorized once and each value column is masked once; every
+    count and sum is then a np.bincount over the shared group codes, with missing
+    keys routed to a spare trailing bin instead of being filtered out. With
+    `squares`, sums of squares are kept for every summed column as well. With
+    `approximate`, medians and distinct counts are kept as mergeable sketches
+    (see sketches.py) instead of exact value counts.
+    """
+    sketch_options = approximate_options(approximate)
+    keys = {}
+    weights = {}
+    value_codes = {}
+    partials = {}
+    for section, (key, spec) in sections.items():
+        with stage(f"aggregate.{section}", rows=len(frame)):
+            if key not in keys:
+                codes, labels = factorize_key(frame, key)
+                bins = np.where(codes < 0, len(labels), codes)
+                keys[key] = codes, labels, bins, np.bincount(bins, minlength=len(labels) + 1)
+            codes, labels, bins, rows = keys[key]
+            size = len(labels) + 1
+
+            stats = {}
+            values = {}
+            sketches = {}
+            for column, column_stats in spec.items():
+                column_stats = _stat_list(column_stats)
+                if column not in weights:
+                    present = frame[column].notna().to_numpy()
+                    weights[column] = (None if present.all() else present.astype(float)), None
+                present, filled = weights[column]
+                if present is None:
+                    stats[(column, 'count')] = rows[:-1]
+                else:
+                    stats[(column, 'count')] = np.bincount(bins, weights=present, minlength=size)[:-1].astype(np.int64)
+
+                if any(stat in SUM_STATS for stat in column_stats):
+                    if filled is None:
+                        filled = frame[column].to_numpy(dtype=float, na_value=0.0)
+                        weights[column] = present, filled
+                    total = np.bincount(bins, weights=filled, minlength=size)[:-1]
+                    if pd.api.types.is_integer_dtype(frame[column].dtype):
+                        total = total.astype(np.int64)
+                    stats[(column, 'sum')] = total
+                    if squares or any(stat in SQUARE_STATS for stat in column_stats):
+                        stats[(column, 'sumsq')] = np.bincount(bins, weights=filled * filled, minlength=size)[:-1]
+
+                if sketch_options is not None:
+                    for stat in column_stats:
+                        if stat in VALUE_STATS:
+                            sketches[(column, stat)] = group_sketches(
+                                codes, labels, frame[column].to_numpy(), stat, sketch_options
+                            )
+                elif any(stat in VALUE_STATS for stat in column_stats):
+                    if column not in value_codes:
+                        column_codes, column_labels = pd.factorize(frame[column])
+                        value_codes[column] = column_codes, pd.Index(column_labels)
+                    values[column] = _value_counts(codes, labels, *value_codes[column])
+
+            partials[section] = {'stats': pd.DataFrame(stats, index=labels), 'values': values, 'sketches': sketches}
+    return partials
+
+
+def partial_aggregate(frame, key, spec, squares=False, approximate=None):
+    """
+    Mergeable partial aggregate of one section over a frame (or a chunk of it).
+
+    Holds non-null counts and sums per group, plus per-group value counts for
+    columns that need a median or a distinct count.
+    """
+    return aggregate_sections(frame, {'section': (key, spec)}, squares=squares, approximate=approximate)['section']
+
+
+def merge_partials(*partials):
+    """
+    Combine partial aggregates of the same section in one concat-and-regroup pass
+    """
+    first = partials[0]
+    levels = list(range(first['stats'].index.nlevels))
+    stats = pd.concat([partial['stats'] for partial in partials]).groupby(level=levels, observed=True).sum()
+    values = {
+        column: pd.concat([partial['values'][column] for partial in partials])
+        .groupby(level=[0, 1], observed=True).sum()
+        for column in first['values']
+    }
+    sketches = {
+        column: functools.reduce(merge_sketches, [partial['sketches'][column] for partial in partials])
+        for column in first.get('sketches', {})
+    }
+    return {'stats': stats, 'values': values, 'sketches': sketches}
+
+
+def _median_from_counts(value_counts):
+    """
+    Exact per-group median from a (group, value) -> count Series
+    """
+    if value_counts.empty:
+        return pd.Series(dtype=float)
+    group_codes, groups = pd.factorize(value_counts.index.get_level_values(0), sort=True)
+    values = value_counts.index.get_level_values(1).to_numpy(dtype=float)
+    counts = value_counts.to_numpy()
+
+    order = np.lexsort((values, group_codes))
+    group_codes, values, counts = group_codes[order], values[order], counts[order]
+
+    totals = np.bincount(group_codes, weights=counts, minlength=len(groups)).astype(np.int64)
+    starts = np.concatenate([[0], np.cumsum(totals)[:-1]])
+    cumulative = np.cumsum(counts)
+    lower = np.searchsorted(cumulative, starts + (totals - 1) // 2, side='right')
+    upper = np.searchsorted(cumulative, starts + totals // 2, side='right')
+    return pd.Series((values[lower] + values[upper]) / 2, index=groups)
+
+
+def default_sections(session_orders):
+    """
+    Sections of the full analysis: all of SECTION_ORDER, except hourly_revenue
+    when session_orders has no datetime 'Order Date' to bucket by hour
+    """
+    dated = 'Order Date' in session_orders and pd.api.types.is_datetime64_any_dtype(session_orders['Order Date'].dtype)
+    return tuple(section for section in SECTION_ORDER if dated or section != 'hourly_revenue')
+
+
+def finalize_partial(partial, key, spec, decimals=2):
+    """
+    Turn a partial aggregate into the same table the pandas groupby/agg would give,
+    rounded to `decimals` (None to leave it unrounded)
+    """
+    stats = partial['stats']
+    columns = {}
+    for column, column_stats in spec.items():
+        for stat in _stat_list(column_stats):
+            if stat == 'count':
+                result = stats[(column, 'count')]
+            elif stat == 'sum':
+                result = stats[(column, 'sum')]
+            elif stat == 'mean':
+                result = stats[(column, 'sum')] / stats[(column, 'count')].where(stats[(column, 'count')] > 0)
+            elif stat in SQUARE_STATS:
+                count = stats[(column, 'count')]
+                spread = stats[(column, 'sumsq')] - stats[(column, 'sum')] ** 2 / count.where(count > 0)
+                result = (spread / (count - 1).where(count > 1)).clip(lower=0)
+                if stat == 'std':
+                    result = np.sqrt(result)
+            elif (column, stat) in partial.get('sketches', {}):
+                result = sketch_result(partial['sketches'][(column, stat)], stat, stats.index)
+            elif stat == 'median':
+                result = _median_from_counts(partial['values'][column]).reindex(stats.index)
+            elif stat == 'nunique':
+                distinct = partial['values'][column].groupby(level=0, observed=True).size()
+                result = distinct.reindex(stats.index, fill_value=0)
+            else:
+                raise ValueError(f"Unsupported statistic: {stat}")
+            columns[(column, stat)] = result
+
+    table = pd.DataFrame(columns, index=stats.index)
+    if all(isinstance(column_stats, str) for column_stats in spec.values()):
+        table.columns = [column for column, _ in table.columns]
+    if key not in DERIVED_KEYS:
+        table.index.name = key
+    return table if decimals is None else table.round(decimals)
+
+
+def session_metrics_from_table(table):
+    """
+    Flatten the single-row session_metrics table into the named metrics dict
+    """
+    metrics = {}
+    for name, column in SESSION_METRICS.items():
+        value = table[column].iloc[0] if len(table) and column in table else np.nan
+        metrics[name] = value.item() if hasattr(value, 'item') else value
+    return metrics
+
+
+def finalize_analysis(partials):
+    """
+    Build the analysis_results dict from the partial aggregates of every section
+    """
+    sections = {**ORDER_SECTIONS, **SESSION_SECTIONS}
+    analysis_results = {}
+    for section in SECTION_ORDER:
+        if section not in partials:
+            continue
+        key, spec = sections[section]
+        with stage(f"finalize.{section}"):
+            table = finalize_partial(partials[section], key, spec, None if section in ADDITIVE_SECTIONS else 2)
+            analysis_results[section] = session_metrics_from_table(table) if key is None else table
+    return analysis_results
@@ -0,0 +1,184 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from aggregates import (
+    ORDER_SECTIONS,
+    SESSION_SECTIONS,
+    aggregate_sections,
+    finalize_analysis,
+    merge_partials,
+)
+from loaders import DATASET_FILES, WORKBOOK_EXTENSIONS
+
+MANIFEST_EXTENSIONS = ('.txt', '.lst')
+
+
+def discover_sources(source):
+    """
+    Data sources of a batch: a list of paths, a manifest file with one path per
+    line, or a directory holding workbooks and/or folders of the three CSV files
+    """
+    if isinstance(source, (list, tuple)):
+        return list(source)
+    source = os.fspath(source)
+    if os.path.isfile(source) and source.lower().endswith(MANIFEST_EXTENSIONS):
+        folder = os.path.dirname(os.path.abspath(source))
+        with open(source) as handle:
+            lines = [line.strip() for line in handle]
+        return [os.path.join(folder, line) for line in lines if line and not line.startswith('#')]
+    if not os.path.isdir(source):
+        raise ValueError(f"Not a directory or manifest: {source}")
+    sources = []
+    for name in sorted(os.listdir(source)):
+        path = os.path.join(source, name)
+        if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith('~$'):
+            sources.append(path)
+        elif os.path.isdir(path) and all(os.path.exists(os.path.join(path, file)) for file in DATASET_FILES):
+            sources.append(path)
+    return sources
+
+
+def process_source(source, kind=None, use_cache=False):
+    """
+    Worker: load -> clean_data -> merge_data -> analysis -> insights for one source.
+
+    Returns the source's insights and its partial aggregates, so the driver can
+    roll sources up without their rows; printed cleaning reports are captured as `log`.
+    Workbooks are parsed without writing the Arrow cache unless `use_cache` is set,
+    so a nightly batch does not leave a copy of every workbook on disk.
+    """
+    from analysis import generate_business_insights
+    from loaders import detect_source_kind, load_datasets
+    from pipeline import load_preprocessing
+
+    started = time.perf_counter()
+    kind = kind or detect_source_kind(source)
+    options = {'use_cache': use_cache} if kind == 'workbook' else {}
+    preprocessing = load_preprocessing()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        user_details, cooking_sessions, order_details = preprocessing.clean_data(
+            *load_datasets(source, kind=kind, **options)
+        )[:3]
+        user_sessions, session_orders = preprocessing.merge_data(user_details, cooking_sessions, order_details)
+    # The same single pass analyze_restaurant_data makes, keeping the partials it finalizes
+    partials = aggregate_sections(session_orders, ORDER_SECTIONS)
+    partials.update(aggregate_sections(user_sessions, SESSION_SECTIONS))
+    insights = generate_business_insights(finalize_analysis(partials))
+    return {
+        'source': source,
+        'orders': len(session_orders),
+        'sessions': len(user_sessions),
+        'insights': insights,
+        'partials': partials,
+        'log': log.getvalue(),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def merge_into(rollup, partials):
+    """
+    Fold one source's partial aggregates into the running cross-source rollup
+    """
+    for section, partial in partials.items():
+        rollup[section] = partial if section not in rollup else merge_partials(rollup[section], partial)
+    return rollup
+
+
+def run_batch(source, workers=None, max_pending=None, kind=None, tasks_per_worker=None, use_cache=False):
+    """
+    Process every source of a batch in a process pool and roll them up.
+
+    At most `max_pending` sources (default: one per worker) are in flight at
+    once, and each result is folded into the rollup as soon as it arrives, so
+    memory follows the number of workers rather than the batch size.
+    `tasks_per_worker` recycles worker processes after that many sources.
+    A source that fails is reported with its error and left out of the rollup.
+    `use_cache` lets workers read and write the Arrow cache of each workbook (see ingestion.py).
+    """
+    sources = discover_sources(source)
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers
+    pool_options = {}
+    if tasks_per_worker:
+        # Recycling workers needs a start method other than fork
+        pool_options = {'mp_context': multiprocessing.get_context('spawn'), 'max_tasks_per_child': tasks_per_worker}
+
+    reports = {}
+    rollup = {}
+    queue = list(reversed(sources))
+    with ProcessPoolExecutor(max_workers=workers, **pool_options) as pool:
+        pending = {}
+        while queue or pending:
+            while queue and len(pending) < max_pending:
+                path = queue.pop()
+                pending[pool.submit(process_source, path, kind, use_cache)] = path
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as error:
+                    reports[path] = {'source': path, 'error': f"{type(error).__name__}: {error}"}
+                    continue
+                merge_into(rollup, result.pop('partials'))
+                reports[path] = result
+
+    from analysis import generate_business_insights
+
+    analysis_results = finalize_analysis(rollup)
+    return {
+        'sources': [reports[path] for path in sources],
+        'analysis_results': analysis_results,
+        'insights': generate_business_insights(analysis_results) if 'meal_analysis' in analysis_results else [],
+    }
+
+
+def summary(batch):
+    """
+    JSON-serialisable summary of a batch: per-source insights or errors and the rollup
+    """
+    sections = {}
+    for section, table in batch['analysis_results'].items():
+        sections[section] = json.loads(table.to_json(orient='split', date_format='iso')) if hasattr(table, 'to_json') else table
+    return {
+        'sources': [{key: value for key, value in report.items() if key != 'log'} for report in batch['sources']],
+        'rollup': {'insights': batch['insights'], 'sections': sections},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse many workbooks in a process pool and roll them up")
+    parser.add_argument('source', help="Directory of workbooks / CSV folders, or a manifest file of paths")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--max-pending', type=int, help="Sources in flight at once (default: one per worker)")
+    parser.add_argument('--tasks-per-worker', type=int, help="Recycle each worker after this many sources")
+    parser.add_argument('--cache', action='store_true', help="Keep an Arrow copy of each workbook for later runs")
+    parser.add_argument('--output', help="Write the batch summary as JSON to this path")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    batch = run_batch(args.source, workers=args.workers, max_pending=args.max_pending,
+                      tasks_per_worker=args.tasks_per_worker, use_cache=args.cache)
+    failed = [report for report in batch['sources'] if 'error' in report]
+    print(f"Processed {len(batch['sources']) - len(failed)} of {len(batch['sources'])} sources "
+          f"in {time.perf_counter() - started:,.1f}s")
+    for report in failed:
+        print(f"  ! {report['source']}: {report['error']}")
+    for insight in batch['insights']:
+        print(f"\n{insight['category']}: {insight['key_finding']}")
+        for metric, value in insight['metrics'].items():
+            print(f"  * {metric}: {value}")
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(summary(batch), handle, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
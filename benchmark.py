@@ -0,0 +1,228 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from pipeline import load_preprocessing
+from profiling import count_rows
+from synthetic import generate_datasets
+
+DEFAULT_SCALES = (10_000, 100_000)
+# Share of the synthetic rows held back and appended in the incremental update benchmark
+APPEND_SHARE = 0.1
+
+
+def measure(stage, scale, fn, make_args, repeat=3):
+    """
+    Time a stage over several runs, then profile its peak allocations in one extra run.
+
+    `make_args` builds fresh arguments for every run so stages that mutate their
+    inputs (clean_data, analyze_restaurant_data) always see the same data.
+    Output printed by the stage itself is discarded.
+    """
+    wall_times = []
+    cpu_times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            args = make_args()
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            result = fn(*args)
+            wall_times.append(time.perf_counter() - wall_start)
+            cpu_times.append(time.process_time() - cpu_start)
+
+        args = make_args()
+        tracemalloc.start()
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    record = {
+        'stage': stage,
+        'scale': scale,
+        'wall_s': statistics.median(wall_times),
+        'cpu_s': statistics.median(cpu_times),
+        'peak_bytes': peak,
+        'rows_in': count_rows(args),
+        'rows_out': count_rows(result),
+    }
+    if hasattr(result, 'to_json'):
+        record['payload_bytes'] = len(result.to_json())
+    return record, result
+
+
+def _text_dates(frames, date_columns):
+    """
+    The tables with their date columns as strings, as read from CSV, so clean_data's
+    date parsing is measured rather than skipped
+    """
+    frames = tuple(frame.copy() for frame in frames)
+    for frame, columns in zip(frames, date_columns.values()):
+        for column in columns:
+            frame[column] = frame[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return frames
+
+
+def _append_split(frames, share=APPEND_SHARE):
+    """
+    Split the tables into a history and an appended delta: the last `share` of each
+    table plus every row that refers to an appended user or session, so history
+    rows only ever refer to history rows
+    """
+    users, sessions, orders = frames
+    new_users = np.arange(len(users)) >= len(users) * (1 - share)
+    new_sessions = (np.arange(len(sessions)) >= len(sessions) * (1 - share)) | \
+        sessions['User ID'].isin(users['User ID'][new_users]).to_numpy()
+    new_orders = (np.arange(len(orders)) >= len(orders) * (1 - share)) | \
+        orders['Session ID'].isin(sessions['Session ID'][new_sessions]).to_numpy()
+    masks = (new_users, new_sessions, new_orders)
+    history = tuple(frame[~mask] for frame, mask in zip(frames, masks))
+    delta = tuple(frame[mask] for frame, mask in zip(frames, masks))
+    return history, delta
+
+
+def benchmark_scale(scale, repeat=3, seed=0):
+    """
+    Benchmark every pipeline stage and plotting function at one scale
+    """
+    import visualization
+    from aggregates import add_age_group
+    from analysis import analyze_restaurant_data, generate_business_insights
+    from incremental import build_state, update_state, verify_state
+
+    preprocessing = load_preprocessing()
+    raw = _text_dates(generate_datasets(scale, seed=seed), preprocessing.DATE_COLUMNS)
+    records = []
+
+    def copies(frames):
+        return lambda: tuple(frame.copy() for frame in frames)
+
+    record, cleaned = measure('clean_data', scale, preprocessing.clean_data, copies(raw), repeat)
+    records.append(record)
+    record, merged = measure('merge_data', scale, preprocessing.merge_data, lambda: cleaned, repeat)
+    records.append(record)
+    record, analysis_results = measure('analyze_restaurant_data', scale, analyze_restaurant_data, copies(merged), repeat)
+    records.append(record)
+    record, _ = measure('generate_business_insights', scale, generate_business_insights, lambda: (analysis_results,), repeat)
+    records.append(record)
+
+    # Fold an appended delta into a state built from the history, then check it against a full rebuild
+    history, delta = _append_split(raw)
+    make_state = lambda: (build_state(*preprocessing.clean_data(*copies(history)())), *copies(delta)())
+    record, state = measure('update_state', scale, update_state, make_state, repeat)
+    with contextlib.redirect_stdout(io.StringIO()):
+        mismatched = verify_state(state, *cleaned)
+    if mismatched:
+        record['error'] = f"verify_state mismatched: {', '.join(mismatched)}"
+    records.append(record)
+
+    user_sessions = add_age_group(merged[0].copy())
+    figures = {
+        'plot_order_performance': (analysis_results['order_analysis'],),
+        'plot_age_demographics': (analysis_results['age_analysis'],),
+        'plot_top_dishes': (analysis_results['dish_analysis'],),
+        'plot_duration_vs_rating': (user_sessions,),
+        'visualize_revenue_patterns': (analysis_results,),
+        'visualize_customer_insights': (user_sessions,),
+        'visualize_menu_performance': (analysis_results,),
+        'visualize_location_performance': (analysis_results,),
+        'plot_revenue_trend': (analysis_results,),
+    }
+    for name, args in figures.items():
+        try:
+            record, _ = measure(name, scale, getattr(visualization, name), lambda args=args: args, repeat)
+        except Exception as e:
+            record = {'stage': name, 'scale': scale, 'error': f"{type(e).__name__}: {str(e)}"}
+        records.append(record)
+    return records
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, repeat=3, seed=0):
+    """
+    Machine-readable benchmark results for all scales
+    """
+    import numpy
+    import pandas
+
+    results = []
+    for scale in scales:
+        results.extend(benchmark_scale(scale, repeat=repeat, seed=seed))
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'pandas': pandas.__version__,
+            'numpy': numpy.__version__,
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Stages whose wall time or peak memory grew by more than `threshold` versus a baseline run
+    """
+    previous = {(record['stage'], record['scale']): record for record in baseline['results']}
+    regressions = []
+    for record in current['results']:
+        before = previous.get((record['stage'], record['scale']))
+        if before is None or 'error' in before or 'error' in record:
+            continue
+        for metric in ('wall_s', 'peak_bytes'):
+            if before[metric] and record[metric] > before[metric] * (1 + threshold):
+                regressions.append({
+                    'stage': record['stage'],
+                    'scale': record['scale'],
+                    'metric': metric,
+                    'baseline': before[metric],
+                    'current': record[metric],
+                    'change': record[metric] / before[metric] - 1,
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the upliance analysis pipeline on synthetic data")
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES), help="Order row counts")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    parser.add_argument('--compare', help="Baseline JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed slowdown before flagging a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scales, repeat=args.repeat, seed=args.seed)
+    print(f"\n{'stage':<30} {'scale':>10} {'wall s':>9} {'cpu s':>9} {'peak MB':>9}")
+    for record in results['results']:
+        if 'error' in record:
+            print(f"{record['stage']:<30} {record['scale']:>10,} failed: {record['error'][:60]}")
+            continue
+        print(f"{record['stage']:<30} {record['scale']:>10,} {record['wall_s']:>9.3f} "
+              f"{record['cpu_s']:>9.3f} {record['peak_bytes'] / 2**20:>9.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare_results(json.load(handle), results, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['stage']} @ {regression['scale']:,}: {regression['metric']} "
+                  f"{regression['baseline']:.3g} -> {regression['current']:.3g} ({regression['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
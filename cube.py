@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import ORDER_SECTIONS, factorize_key, finalize_partial
+from joins import index_table, resolve_positions
+
+# Cube dimensions and the session_orders (or joined user) column each one reads
+CUBE_DIMENSIONS = {
+    'Location': 'Location',
+    'Age_Group': 'Age_Group',
+    'Meal Type': 'Meal Type_x',
+    'Time of Day': 'Time of Day',
+    'Order Status': 'Order Status',
+}
+
+# Additive measures kept in every cell, as the (column, stat) they total
+CUBE_MEASURES = {
+    'orders': ('Order ID', 'count'),
+    'revenue': ('Amount (USD)', 'sum'),
+    'amount_count': ('Amount (USD)', 'count'),
+    'rating_sum': ('Rating', 'sum'),
+    'rating_count': ('Rating', 'count'),
+    'duration_sum': ('Duration (mins)', 'sum'),
+    'duration_count': ('Duration (mins)', 'count'),
+}
+
+# Means reported by cube queries, as (sum measure, count measure)
+CUBE_MEANS = {
+    'avg_order_value': ('revenue', 'amount_count'),
+    'avg_rating': ('rating_sum', 'rating_count'),
+    'avg_duration': ('duration_sum', 'duration_count'),
+}
+
+
+def build_cube(session_orders, user_details):
+    """
+    Materialize additive order measures over every combination of CUBE_DIMENSIONS.
+
+    Each order is joined to its user (for Location and Age_Group) by row
+    position, every dimension is factorized to dense integer codes, and each
+    measure is a single np.bincount over the flattened cell number. Every axis
+    has one trailing slot for missing values, so roll-ups still count those rows.
+    """
+    users = index_table(user_details, 'User ID')
+    positions = resolve_positions(users, session_orders['User ID_x'])
+    columns = {
+        column: session_orders[column]
+        for column in CUBE_DIMENSIONS.values() if column in session_orders
+    }
+    for column in ('Location', 'Age'):
+        values = pd.api.extensions.take(user_details[column].array, positions, allow_fill=True)
+        columns[column] = pd.Series(values, index=session_orders.index)
+
+    labels = {}
+    axis_codes = []
+    for dimension, column in CUBE_DIMENSIONS.items():
+        codes, dimension_labels = factorize_key(columns, column)
+        labels[dimension] = dimension_labels
+        axis_codes.append(np.where(codes < 0, len(dimension_labels), codes))
+    shape = tuple(len(dimension_labels) + 1 for dimension_labels in labels.values())
+    cells = np.ravel_multi_index(axis_codes, shape)
+
+    size = int(np.prod(shape))
+    measures = {}
+    for name, (column, stat) in CUBE_MEASURES.items():
+        values = session_orders[column]
+        if stat == 'count':
+            total = np.bincount(cells, weights=values.notna().to_numpy(), minlength=size).astype(np.int64)
+        else:
+            total = np.bincount(cells, weights=values.to_numpy(dtype=float, na_value=0.0), minlength=size)
+        measures[name] = total.reshape(shape)
+    return {'dimensions': labels, 'measures': measures}
+
+
+def slice_cube(cube, **filters):
+    """
+    Sub-cube keeping only the given labels of some dimensions.
+
+    Keyword names are dimensions with spaces replaced by underscores
+    (e.g. Meal_Type='Dinner'); values are one label or a list of labels.
+    """
+    dimensions = dict(cube['dimensions'])
+    selectors = [slice(None)] * len(dimensions)
+    names = list(dimensions)
+    for keyword, wanted in filters.items():
+        dimension = keyword if keyword in dimensions else keyword.replace('_', ' ')
+        if dimension not in dimensions:
+            raise ValueError(f"Unknown cube dimension: {keyword}")
+        wanted = [wanted] if np.ndim(wanted) == 0 else list(wanted)
+        positions = dimensions[dimension].get_indexer(wanted)
+        positions = np.unique(positions[positions >= 0])
+        axis = names.index(dimension)
+        # Keep the empty missing slot so every axis still ends in one
+        selectors[axis] = np.append(positions, len(dimensions[dimension]))
+        dimensions[dimension] = dimensions[dimension][positions]
+    measures = {}
+    for name, values in cube['measures'].items():
+        for axis, selector in enumerate(selectors):
+            if not isinstance(selector, slice):
+                values = np.take(values, selector, axis=axis)
+                values = _clear_missing(values, axis)
+        measures[name] = values
+    return {'dimensions': dimensions, 'measures': measures}
+
+
+def _clear_missing(values, axis):
+    """
+    Zero the trailing missing-value slot of an axis after a slice picked real labels
+    """
+    values = values.copy()
+    index = [slice(None)] * values.ndim
+    index[axis] = -1
+    values[tuple(index)] = 0
+    return values
+
+
+def rollup(cube, by=()):
+    """
+    Measures summed over every dimension not in `by`, one row per non-empty
+    combination of the `by` labels, with CUBE_MEANS added
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    names = list(cube['dimensions'])
+    unknown = [dimension for dimension in by if dimension not in names]
+    if unknown:
+        raise ValueError(f"Unknown cube dimensions: {unknown}")
+    kept = [names.index(dimension) for dimension in by]
+    dropped = tuple(axis for axis in range(len(names)) if axis not in kept)
+
+    totals = {}
+    for name, values in cube['measures'].items():
+        summed = values.sum(axis=dropped)
+        # Order the remaining axes as requested, then drop their missing slots
+        summed = np.transpose(summed, np.argsort(np.argsort(kept))) if kept else summed
+        summed = summed[tuple(slice(0, -1) for _ in kept)]
+        totals[name] = np.asarray(summed).ravel()
+
+    if by:
+        index = pd.MultiIndex.from_product([cube['dimensions'][dimension] for dimension in by], names=by)
+        if len(by) == 1:
+            index = index.get_level_values(0)
+    else:
+        index = pd.RangeIndex(1)
+    table = pd.DataFrame(totals, index=index)
+    table = table[table['orders'] > 0]
+    for name, (total, count) in CUBE_MEANS.items():
+        table[name] = (table[total] / table[count].where(table[count] > 0)).round(2)
+    return table
+
+
+def query(cube, by=(), **filters):
+    """
+    Slice, then roll up: e.g. query(cube, by=['Location', 'Meal Type'], Age_Group='26-35')
+    """
+    return rollup(slice_cube(cube, **filters) if filters else cube, by)
+
+
+def project(cube, section):
+    """
+    An analysis_results table recomputed from the cube.
+
+    Works for order sections grouped by a cube dimension whose statistics are
+    all additive (count, sum, mean); medians and distinct counts need the rows.
+    """
+    key, spec = ORDER_SECTIONS[section]
+    dimension = next((name for name, column in CUBE_DIMENSIONS.items() if column == key), None)
+    stats = [(column, stat) for column, column_stats in spec.items()
+             for stat in ([column_stats] if isinstance(column_stats, str) else column_stats)]
+    measures = {stat_key: name for name, stat_key in CUBE_MEASURES.items()}
+    if dimension is None or any(stat not in ('count', 'sum', 'mean') for _, stat in stats):
+        raise ValueError(f"{section} cannot be derived from the cube")
+
+    totals = rollup(cube, by=[dimension])
+    partial_stats = {}
+    for column, stat in stats:
+        for needed in ('count',) if stat == 'count' else ('count', 'sum'):
+            if (column, needed) not in measures:
+                raise ValueError(f"{section} cannot be derived from the cube")
+            partial_stats[(column, needed)] = totals[measures[(column, needed)]]
+    partial = {'stats': pd.DataFrame(partial_stats, index=totals.index.rename(key)), 'values': {}, 'sketches': {}}
+    return finalize_partial(partial, key, spec)
@@ -1,25 +1,33 @@
 import pandas as pd
 import numpy as np
-from google.colab import files
-import io
+from ingestion import read_workbook
+from schema import apply_schema
+from joins import index_table, lazy_join
+from parsing import parse_datetime_columns, parse_numeric_column
+from profiling import stage
+
+# Date columns of each dataset, parsed concurrently by clean_data
+DATE_COLUMNS = {
+    'UserDetails': ['Registration Date'],
+    'CookingSessions': ['Session Start', 'Session End'],
+    'OrderDetails': ['Order Date'],
+}
 
 def upload_and_read_data():
     """
-    Upload single Excel file with multiple sheets and read them into pandas DataFrames
+    Upload single Excel file with multiple sheets and read them into pandas DataFrames.
+    Only available inside Colab; use loaders.load_datasets for headless runs.
     """
+    from google.colab import files
+
     try:
         print("Please upload the Excel file containing all datasets")
         uploaded = files.upload()
         print("File uploaded successfully!")
         
-        # Read the uploaded Excel file
-        excel_file = io.BytesIO(list(uploaded.values())[0])
-        
-        # Load the required sheets
+        # Load the required sheets, from the columnar cache when this workbook was seen before
         print("Reading sheets from the Excel file...")
-        user_details = pd.read_excel(excel_file, sheet_name='UserDetails.csv')
-        cooking_sessions = pd.read_excel(excel_file, sheet_name='CookingSessions.csv')
-        order_details = pd.read_excel(excel_file, sheet_name='OrderDetails.csv')
+        user_details, cooking_sessions, order_details = read_workbook(list(uploaded.values())[0])
         print("Sheets read successfully!")
         
         return user_details, cooking_sessions, order_details
@@ -28,41 +36,113 @@ def upload_and_read_data():
         print(f"An error occurred: {str(e)}")
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
-def clean_data(user_details, cooking_sessions, order_details):
+def _parse_numbers(frame, column, report):
+    """
+    Parse a numeric column in place, recording values that are not numbers in `report`
+    """
+    frame[column], failures = parse_numeric_column(frame[column])
+    if report is not None and len(failures):
+        report[column] = failures
+
+def clean_user_details(user_details, report=None):
     """
-    Clean and preprocess the datasets
+    Clean the UserDetails dataset
     """
-    # Clean UserDetails
-    user_details['Registration Date'] = pd.to_datetime(user_details['Registration Date'])
+    parse_datetime_columns([(user_details, column) for column in DATE_COLUMNS['UserDetails']], report=report)
     user_details['Age'] = user_details['Age'].fillna(user_details['Age'].median())
-    user_details = user_details.dropna(subset=['User ID'])
-    
-    # Clean CookingSessions
-    cooking_sessions['Session Start'] = pd.to_datetime(cooking_sessions['Session Start'], errors='coerce')
-    cooking_sessions['Session End'] = pd.to_datetime(cooking_sessions['Session End'], errors='coerce')
+    return user_details.dropna(subset=['User ID'])
+
+def clean_cooking_sessions(cooking_sessions, report=None):
+    """
+    Clean the CookingSessions dataset
+    """
+    parse_datetime_columns([(cooking_sessions, column) for column in DATE_COLUMNS['CookingSessions']], report=report)
+    _parse_numbers(cooking_sessions, 'Duration (mins)', report)
     cooking_sessions['Duration (mins)'] = cooking_sessions['Duration (mins)'].fillna(0).astype(int)
-    cooking_sessions = cooking_sessions.dropna(subset=['User ID', 'Dish Name'])
-    
-    # Clean OrderDetails
-    order_details['Order Date'] = pd.to_datetime(order_details['Order Date'])
+    return cooking_sessions.dropna(subset=['User ID', 'Dish Name'])
+
+def clean_order_details(order_details, report=None):
+    """
+    Clean the OrderDetails dataset, or any chunk of its rows
+    """
+    parse_datetime_columns([(order_details, column) for column in DATE_COLUMNS['OrderDetails']], report=report)
+    _parse_numbers(order_details, 'Amount (USD)', report)
     order_details['Amount (USD)'] = order_details['Amount (USD)'].fillna(0).astype(float)
-    order_details = order_details.dropna(subset=['User ID', 'Order ID'])
+    return order_details.dropna(subset=['User ID', 'Order ID'])
+
+def clean_data(user_details, cooking_sessions, order_details, compact=False, report=None):
+    """
+    Clean and preprocess the datasets.
+    With compact=True the declared schema in schema.py is applied as well, and the
+    ID dictionaries (integer code -> original ID) are returned as a fourth value.
+    Values that fail to parse as dates or numbers become missing and are listed;
+    pass a dict as `report` to receive them (raw values by row, per column).
+    """
+    report = {} if report is None else report
+    
+    # Detect each date format once and parse all four date columns concurrently
+    tables = {'UserDetails': user_details, 'CookingSessions': cooking_sessions, 'OrderDetails': order_details}
+    with stage('clean_data.parse_dates', inputs=tuple(tables.values())):
+        parse_datetime_columns(
+            [(tables[name], column) for name, columns in DATE_COLUMNS.items() for column in columns],
+            report=report
+        )
+    
+    with stage('clean_data.user_details', inputs=user_details) as record:
+        user_details = record.output(clean_user_details(user_details, report))
+    with stage('clean_data.cooking_sessions', inputs=cooking_sessions) as record:
+        cooking_sessions = record.output(clean_cooking_sessions(cooking_sessions, report))
+    with stage('clean_data.order_details', inputs=order_details) as record:
+        order_details = record.output(clean_order_details(order_details, report))
     
     print("\nDataset Dimensions:")
     print(f"UserDetails: {user_details.shape}")
     print(f"CookingSessions: {cooking_sessions.shape}")
     print(f"OrderDetails: {order_details.shape}")
     
+    if report:
+        print("\nUnparsed Values:")
+        for column, failures in report.items():
+            print(f"{column}: {len(failures):,} rows, e.g. {list(failures.unique()[:3])}")
+    
+    if compact:
+        with stage('clean_data.compact_schema', inputs=(user_details, cooking_sessions, order_details)) as record:
+            user_details, cooking_sessions, order_details, id_maps, memory_report = apply_schema(
+                user_details, cooking_sessions, order_details
+            )
+            record.output((user_details, cooking_sessions, order_details))
+        print("\nMemory Saved by Compact Schema:")
+        for name, sizes in memory_report.items():
+            print(f"{name}: {sizes['before_bytes'] / 2**20:,.1f} MB -> {sizes['after_bytes'] / 2**20:,.1f} MB")
+        return user_details, cooking_sessions, order_details, id_maps
+    
     return user_details, cooking_sessions, order_details
 
-def merge_data(user_details, cooking_sessions, order_details):
+def merge_user_sessions(user_details, cooking_sessions):
     """
-    Merge datasets to create meaningful relationships
+    Merge cooking sessions with user details
     """
-    # Merge cooking sessions with user details
-    user_sessions = pd.merge(cooking_sessions, user_details, on="User ID", how="left")
-    
-    # Merge order details with cooking sessions
-    session_orders = pd.merge(order_details, cooking_sessions, on="Session ID", how="left")
-    
-    return user_sessions, session_orders
+    return pd.merge(cooking_sessions, user_details, on="User ID", how="left")
+
+def merge_session_orders(cooking_sessions, order_details):
+    """
+    Merge order details with cooking sessions
+    """
+    return pd.merge(order_details, cooking_sessions, on="Session ID", how="left")
+
+def merge_data(user_details, cooking_sessions, order_details, lazy=False):
+    """
+    Merge datasets to create meaningful relationships.
+    With lazy=True, sessions and users are indexed by their IDs instead and the
+    merged frames are JoinedFrame views that gather columns only when read.
+    """
+    with stage('merge_data', inputs=(user_details, cooking_sessions, order_details), lazy=lazy) as record:
+        if lazy:
+            user_sessions = lazy_join(cooking_sessions, index_table(user_details, 'User ID'))
+            session_orders = lazy_join(order_details, index_table(cooking_sessions, 'Session ID'))
+            return record.output((user_sessions, session_orders))
+        
+        user_sessions = merge_user_sessions(user_details, cooking_sessions)
+        session_orders = merge_session_orders(cooking_sessions, order_details)
+        
+        return record.output((user_sessions, session_orders))
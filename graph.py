@@ -0,0 +1,93 @@
+from aggregates import (
+    DERIVED_KEYS,
+    ORDER_SECTIONS,
+    SECTION_ORDER,
+    SESSION_SECTIONS,
+    aggregate_sections,
+    finalize_analysis,
+    section_columns,
+)
+
+# Every section node: its group key (plain or derived) and the columns it aggregates
+SECTIONS = {**ORDER_SECTIONS, **SESSION_SECTIONS}
+TABLES = {'session_orders': ORDER_SECTIONS, 'user_sessions': SESSION_SECTIONS}
+
+# Consumers of analysis_results and the sections each one reads
+CONSUMERS = {
+    'insights': ('meal_analysis',),
+    'plot_order_performance': ('order_analysis',),
+    'plot_age_demographics': ('age_analysis',),
+    'plot_top_dishes': ('dish_analysis',),
+    'visualize_revenue_patterns': ('time_analysis', 'meal_analysis'),
+    'visualize_customer_insights': ('age_analysis', 'rating_distribution', 'duration_rating_distribution'),
+    'visualize_menu_performance': ('dish_analysis', 'meal_analysis', 'time_analysis'),
+    'visualize_location_performance': ('location_metrics',),
+    'revenue_rollups': ('hourly_revenue',),
+    'plot_revenue_trend': ('hourly_revenue',),
+}
+
+# Figure functions (served by service.py, exported by report.py) and the input each one is drawn from
+FIGURE_INPUTS = {
+    'plot_order_performance': 'order_analysis',
+    'plot_age_demographics': 'age_analysis',
+    'plot_top_dishes': 'dish_analysis',
+    'plot_duration_vs_rating': 'user_sessions',
+    'visualize_revenue_patterns': 'analysis_results',
+    'visualize_customer_insights': 'analysis_results',
+    'visualize_menu_performance': 'analysis_results',
+    'visualize_location_performance': 'analysis_results',
+    'plot_revenue_trend': 'analysis_results',
+}
+
+
+def required_sections(outputs):
+    """
+    Sections needed for a set of outputs (section or consumer names), in SECTION_ORDER
+    """
+    outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+    needed = set()
+    for output in outputs:
+        if output in CONSUMERS:
+            needed.update(CONSUMERS[output])
+        elif output in SECTIONS:
+            needed.add(output)
+        else:
+            raise ValueError(f"Unknown analysis output: {output}")
+    return [section for section in SECTION_ORDER if section in needed]
+
+
+def plan(outputs):
+    """
+    The evaluation plan for some outputs: sections to compute, columns each table
+    is read for, and the derived keys computed along the way
+    """
+    sections = required_sections(outputs)
+    columns = {}
+    for table, specs in TABLES.items():
+        needed = {section: specs[section] for section in sections if section in specs}
+        if needed:
+            columns[table] = section_columns(needed)
+    derived = []
+    for section in sections:
+        key = SECTIONS[section][0]
+        if key in DERIVED_KEYS and key not in derived:
+            derived.append(key)
+    return {'sections': sections, 'columns': columns, 'derived': derived}
+
+
+def compute_sections(user_sessions, session_orders, outputs, approximate=False):
+    """
+    analysis_results restricted to what `outputs` needs.
+
+    Only the required sections are aggregated and only the columns they read are
+    touched; a table that no required section reads is skipped entirely, and
+    derived keys such as Age_Group are computed on the fly instead of being
+    added to the frames.
+    """
+    sections = required_sections(outputs)
+    partials = {}
+    for frame, specs in ((session_orders, ORDER_SECTIONS), (user_sessions, SESSION_SECTIONS)):
+        needed = {section: specs[section] for section in sections if section in specs}
+        if needed:
+            partials.update(aggregate_sections(frame, needed, approximate=approximate))
+    return finalize_analysis(partials)
@@ -0,0 +1,256 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from aggregates import (
+    ORDER_SECTIONS,
+    SESSION_SECTIONS,
+    aggregate_sections,
+    approximate_options,
+    finalize_analysis,
+    merge_partials,
+)
+from pipeline import load_preprocessing
+
+# Relative drift allowed between folded and recomputed unrounded sums (e.g. hourly_revenue)
+VERIFY_RTOL = 1e-9
+
+
+def _partial_size(partial):
+    """
+    Entries held by a partial aggregate: its group rows and (group, value) counts
+    """
+    if partial is None:
+        return 0
+    return len(partial['stats']) + sum(len(counts) for counts in partial['values'].values())
+
+
+def _compact(state, section):
+    """
+    Merge a section's queued deltas into its folded partial in one pass
+    """
+    queued = state['pending'].pop(section, [])
+    if section in state['partials']:
+        queued.insert(0, state['partials'][section])
+    if queued:
+        state['partials'][section] = merge_partials(*queued)
+
+
+def _fold(state, delta_partials):
+    """
+    Queue a delta's partials, compacting a section only once its queue outgrows what is
+    already folded. Each compaction then costs at most twice the deltas queued since the
+    last one, so updates take time proportional to the delta, amortised.
+    """
+    pending = state.setdefault('pending', {})
+    for section, delta in delta_partials.items():
+        queued = pending.setdefault(section, [])
+        queued.append(delta)
+        if sum(map(_partial_size, queued)) >= _partial_size(state['partials'].get(section)):
+            _compact(state, section)
+    return state
+
+
+def _age_median(age_counts):
+    """
+    Exact median age from an age -> count Series
+    """
+    if age_counts.empty:
+        return np.nan
+    age_counts = age_counts.sort_index()
+    ages = age_counts.index.to_numpy(dtype=float)
+    cumulative = np.cumsum(age_counts.to_numpy())
+    total = cumulative[-1]
+    lower = ages[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+    upper = ages[np.searchsorted(cumulative, total // 2, side='right')]
+    return (lower + upper) / 2
+
+
+def _known_users(state, user_ids):
+    """
+    Stored user rows for these User IDs, gathered from the chunks that hold them
+    """
+    located = {}
+    for user_id in pd.unique(user_ids):
+        where = state['user_rows'].get(user_id)
+        if where is not None:
+            located.setdefault(where[0], []).append(where[1])
+    chunks = [state['user_chunks'][chunk].iloc[positions] for chunk, positions in located.items()]
+    if not chunks:
+        return state['user_chunks'][0].iloc[:0]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _session_order_rows(state, order_details):
+    """
+    Rows a left merge of these orders onto all sessions seen so far would produce.
+
+    The order sections only read order columns, so the join reduces to repeating
+    each order once per matching session and suffixing the shared column names.
+    """
+    session_ids = order_details['Session ID']
+    distinct = pd.unique(session_ids)
+    known = pd.Series([state['session_counts'].get(session_id, 1) for session_id in distinct], index=distinct)
+    matches = known.reindex(session_ids).to_numpy(dtype=np.int64).clip(min=1)
+    if (matches > 1).any():
+        order_details = order_details.loc[order_details.index.repeat(matches)]
+    shared = [column for column in order_details.columns
+              if column in state['session_columns'] and column != 'Session ID']
+    return order_details.rename(columns={column: f"{column}_x" for column in shared})
+
+
+def _add_sessions(state, cooking_sessions):
+    """
+    Fold cleaned sessions into the state and record their Session IDs for later order joins
+    """
+    preprocessing = load_preprocessing()
+    counts = cooking_sessions['Session ID'].value_counts()
+    if any(session_id in state['session_counts'] for session_id in counts.index):
+        # A repeated Session ID changes how many times already-folded orders join
+        raise ValueError("New sessions repeat existing Session IDs; rebuild the state instead")
+
+    users = _known_users(state, cooking_sessions['User ID'])
+    user_sessions = preprocessing.merge_user_sessions(users, cooking_sessions)
+    _fold(state, aggregate_sections(
+        user_sessions, SESSION_SECTIONS, squares=True, approximate=state.get('approximate')
+    ))
+    state['session_counts'].update(zip(counts.index, counts.tolist()))
+    state['session_columns'] = list(cooking_sessions.columns)
+    state['rows']['sessions'] += len(cooking_sessions)
+
+
+def _add_orders(state, order_details):
+    """
+    Fold cleaned orders into the state
+    """
+    session_orders = _session_order_rows(state, order_details)
+    _fold(state, aggregate_sections(
+        session_orders, ORDER_SECTIONS, squares=True, approximate=state.get('approximate')
+    ))
+    state['rows']['orders'] += len(order_details)
+
+
+def _add_users(state, user_details):
+    """
+    Append cleaned users as a new chunk of the lookup later sessions are joined against
+    """
+    user_ids = user_details['User ID'].tolist()
+    if any(user_id in state['user_rows'] for user_id in user_ids):
+        # A repeated User ID would duplicate the sessions joined to it
+        raise ValueError("New users repeat existing User IDs; rebuild the state instead")
+    chunk = len(state['user_chunks'])
+    state['user_chunks'].append(user_details.reset_index(drop=True))
+    state['user_rows'].update((user_id, (chunk, position)) for position, user_id in enumerate(user_ids))
+    state['age_counts'] = state['age_counts'].add(user_details['Age'].value_counts(), fill_value=0)
+
+
+def build_state(user_details, cooking_sessions, order_details, approximate=False):
+    """
+    Aggregate state for the full history of cleaned datasets.
+
+    Keeps per-group counts, sums, sums of squares and exact value counts (for
+    medians and distinct users) for every section of analysis_results, so later
+    deltas can be folded in without revisiting old rows. With `approximate`
+    (True or a dict of sketch settings), medians and distinct users are kept as
+    t-digest and HyperLogLog sketches instead, so the state stays constant-size per group.
+    Users are kept in appended chunks behind a User ID -> (chunk, row) dict and
+    sessions as a Session ID -> count dict, so an update only looks up its own IDs.
+    """
+    state = {
+        'approximate': approximate,
+        'pending': {},
+        'user_chunks': [],
+        'user_rows': {},
+        'age_counts': pd.Series(dtype=float),
+        'session_counts': {},
+        'session_columns': list(cooking_sessions.columns),
+        'partials': {},
+        'rows': {'sessions': 0, 'orders': 0},
+    }
+    _add_users(state, user_details)
+    _add_sessions(state, cooking_sessions)
+    _add_orders(state, order_details)
+    return state
+
+
+def update_state(state, new_users=None, new_sessions=None, new_orders=None):
+    """
+    Fold appended UserDetails, CookingSessions and/or OrderDetails rows into the state.
+
+    Delta rows are cleaned like clean_data does, except that missing ages are
+    filled with the median age of all users so far instead of the delta's own;
+    users go first so new sessions join against them, then sessions so new
+    orders do. Work is proportional to the size of the delta.
+    """
+    preprocessing = load_preprocessing()
+    if new_users is not None and len(new_users):
+        new_users = new_users.copy()
+        ages = state['age_counts'].add(new_users['Age'].value_counts(), fill_value=0)
+        new_users['Age'] = new_users['Age'].fillna(_age_median(ages))
+        _add_users(state, preprocessing.clean_user_details(new_users))
+    if new_sessions is not None and len(new_sessions):
+        _add_sessions(state, preprocessing.clean_cooking_sessions(new_sessions.copy()))
+    if new_orders is not None and len(new_orders):
+        _add_orders(state, preprocessing.clean_order_details(new_orders.copy()))
+    return state
+
+
+def analysis_from_state(state):
+    """
+    Current analysis_results from the aggregate state, compacting any queued deltas first
+    """
+    for section in list(state.get('pending', {})):
+        _compact(state, section)
+    return finalize_analysis(state['partials'])
+
+
+def _matches(expected, actual, rtol):
+    expected, actual = pd.DataFrame(expected), pd.DataFrame(actual)
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_exact=False, rtol=rtol)
+    except AssertionError:
+        return False
+    return True
+
+
+def verify_state(state, user_details, cooking_sessions, order_details):
+    """
+    Rebuild analysis_results from scratch and check the incremental state matches it.
+    Folded sums may drift from recomputed ones by float rounding (VERIFY_RTOL);
+    an approximate state is allowed three times its sketches' relative error.
+    """
+    from analysis import analyze_restaurant_data
+
+    preprocessing = load_preprocessing()
+    user_sessions, session_orders = preprocessing.merge_data(user_details, cooking_sessions, order_details)
+    expected = analyze_restaurant_data(user_sessions, session_orders)
+    actual = analysis_from_state(state)
+    options = approximate_options(state.get('approximate'))
+    rtol = 3 * options['relative_error'] if options else VERIFY_RTOL
+
+    mismatched = []
+    for section, table in expected.items():
+        if isinstance(table, dict):
+            table, other = pd.Series(table).to_frame(), pd.Series(actual.get(section)).to_frame()
+        else:
+            other = actual.get(section)
+        if other is None or not _matches(table, other, rtol):
+            mismatched.append(section)
+    return mismatched
+
+
+def save_state(state, path):
+    """
+    Persist the aggregate state between runs
+    """
+    with open(path, 'wb') as handle:
+        pickle.dump(state, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_state(path):
+    """
+    Load an aggregate state written by save_state
+    """
+    with open(path, 'rb') as handle:
+        return pickle.load(handle)
@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import ORDER_SECTIONS, SESSION_SECTIONS, default_sections, section_columns
+from graph import required_sections
+from joins import index_table, resolve_positions
+from profiling import stage
+
+# Date column each table is range-filtered on
+DATE_COLUMNS = {
+    'session_orders': 'Order Date',
+    'user_sessions': 'Session Start',
+}
+
+# Filterable dimensions and the column holding them in each table. Order Status
+# only exists for orders, so a status filter leaves the session sections untouched.
+FILTER_COLUMNS = {
+    'session_orders': {
+        'Location': 'Location',
+        'Dish Name': 'Dish Name_x',
+        'Meal Type': 'Meal Type_x',
+        'Order Status': 'Order Status',
+    },
+    'user_sessions': {
+        'Location': 'Location',
+        'Dish Name': 'Dish Name',
+        'Meal Type': 'Meal Type',
+    },
+}
+
+# Keyword arguments of filtered_analysis and the dimension each one filters
+FILTER_ARGUMENTS = {
+    'locations': 'Location',
+    'dishes': 'Dish Name',
+    'meal_types': 'Meal Type',
+    'statuses': 'Order Status',
+}
+
+
+def _position_dtype(rows):
+    return np.int32 if rows < 2 ** 31 else np.int64
+
+
+def date_index(values):
+    """
+    Row positions sorted by date, with the sorted dates (missing dates first, then skipped)
+    """
+    dates = pd.Series(values).to_numpy(dtype='datetime64[us]')
+    order = np.argsort(dates, kind='stable').astype(_position_dtype(len(dates)), copy=False)
+    sorted_dates = dates[order]
+    missing = int(np.isnat(dates).sum())
+    # argsort puts NaT last; rotate them to the front so the dated rows are one sorted run
+    order = np.roll(order, missing)
+    sorted_dates = np.roll(sorted_dates, missing)
+    return {'values': dates, 'order': order, 'sorted': sorted_dates, 'missing': missing}
+
+
+def dimension_index(values):
+    """
+    Integer code of every row plus, per label, its row positions as one contiguous
+    run of a code-sorted position array (the run of code i is offsets[i]:offsets[i + 1])
+    """
+    codes, labels = pd.factorize(pd.Series(values))
+    order = np.argsort(codes, kind='stable').astype(_position_dtype(len(codes)), copy=False)
+    counts = np.bincount(codes[codes >= 0], minlength=len(labels))
+    missing = int((codes < 0).sum())
+    offsets = np.concatenate([[0], np.cumsum(counts)]) + missing
+    return {'labels': pd.Index(labels), 'codes': codes, 'order': order, 'offsets': offsets}
+
+
+def build_table_index(frame, table, locations=None):
+    """
+    Date and dimension indexes of one merged table; a date column that does not
+    hold datetimes gets no date index, like a missing one.
+
+    `locations` supplies a Location column for tables that do not carry one.
+    """
+    columns = dict(FILTER_COLUMNS[table])
+    dimensions = {}
+    for dimension, column in columns.items():
+        if dimension == 'Location' and locations is not None:
+            dimensions[dimension] = dimension_index(locations)
+        elif column in frame:
+            dimensions[dimension] = dimension_index(frame[column])
+    date_column = DATE_COLUMNS[table]
+    dated = date_column in frame and pd.api.types.is_datetime64_any_dtype(frame[date_column].dtype)
+    return {
+        'frame': frame,
+        'rows': len(frame),
+        'dates': date_index(frame[date_column]) if dated else None,
+        'dimensions': dimensions,
+    }
+
+
+def build_indexes(user_details, user_sessions, session_orders):
+    """
+    Indexes of both merged tables, built once after loading for any number of
+    filtered_analysis calls.
+
+    Orders carry no Location, so each order takes its user's Location (joined on
+    User ID_x) for its Location index.
+    """
+    with stage('build_indexes', inputs=(user_sessions, session_orders)):
+        positions = resolve_positions(index_table(user_details, 'User ID'), session_orders['User ID_x'])
+        order_locations = pd.api.extensions.take(user_details['Location'].array, positions, allow_fill=True)
+        return {
+            'session_orders': build_table_index(session_orders, 'session_orders', locations=order_locations),
+            'user_sessions': build_table_index(user_sessions, 'user_sessions'),
+        }
+
+
+def _timestamp(value):
+    return None if value is None else np.datetime64(pd.Timestamp(value).as_unit('us').to_datetime64())
+
+
+def _date_range(dates, start, end):
+    """
+    Bounds [low, high) within the date-sorted positions of rows dated in [start, end)
+    """
+    sorted_dates = dates['sorted']
+    low = dates['missing']
+    high = len(sorted_dates)
+    if start is not None:
+        low = max(low, int(np.searchsorted(sorted_dates, _timestamp(start), side='left')))
+    if end is not None:
+        high = int(np.searchsorted(sorted_dates[low:], _timestamp(end), side='left')) + low
+    return low, max(low, high)
+
+
+def select_rows(table_index, start=None, end=None, **filters):
+    """
+    Sorted row positions matching every predicate, or None when nothing is filtered.
+
+    The most selective predicate supplies candidate positions straight from its
+    index; the others are checked only on those candidates, through their codes
+    or dates. Filters name dimensions (e.g. {'Location': ['Goa']}); dimensions
+    the table does not have are ignored.
+    """
+    predicates = []
+    if (start is not None or end is not None) and table_index['dates'] is not None:
+        dates = table_index['dates']
+        low, high = _date_range(dates, start, end)
+        predicates.append((high - low, 'date', (low, high)))
+        bounds = (_timestamp(start), _timestamp(end))
+    for dimension, wanted in filters.items():
+        if wanted is None or dimension not in table_index['dimensions']:
+            continue
+        index = table_index['dimensions'][dimension]
+        wanted = [wanted] if np.ndim(wanted) == 0 else list(wanted)
+        codes = np.unique(index['labels'].get_indexer(wanted))
+        codes = codes[codes >= 0]
+        size = int(sum(index['offsets'][code + 1] - index['offsets'][code] for code in codes))
+        predicates.append((size, dimension, codes))
+    if not predicates:
+        return None
+
+    predicates.sort(key=lambda predicate: predicate[0])
+    _, kind, selector = predicates[0]
+    if kind == 'date':
+        positions = table_index['dates']['order'][selector[0]:selector[1]]
+    else:
+        index = table_index['dimensions'][kind]
+        positions = np.concatenate(
+            [index['order'][index['offsets'][code]:index['offsets'][code + 1]] for code in selector]
+            or [index['order'][:0]]
+        )
+    for _, kind, selector in predicates[1:]:
+        if not len(positions):
+            break
+        if kind == 'date':
+            values = table_index['dates']['values'][positions]
+            keep = ~np.isnat(values)
+            if bounds[0] is not None:
+                keep &= values >= bounds[0]
+            if bounds[1] is not None:
+                keep &= values < bounds[1]
+            positions = positions[keep]
+        else:
+            index = table_index['dimensions'][kind]
+            wanted = np.zeros(len(index['labels']) + 1, dtype=bool)
+            wanted[selector] = True
+            # Missing codes (-1) land on the trailing False slot
+            positions = positions[wanted[index['codes'][positions]]]
+    return np.sort(positions)
+
+
+def take_rows(frame, positions, columns):
+    """
+    The given columns of a frame at some row positions, as a new DataFrame
+    """
+    columns = [column for column in columns if column in frame]
+    if positions is None:
+        return pd.DataFrame({column: frame[column] for column in columns})
+    return pd.DataFrame(
+        {column: frame[column].array.take(positions) for column in columns},
+        index=pd.RangeIndex(len(positions))
+    )
+
+
+def filtered_analysis(indexes, start=None, end=None, locations=None, dishes=None,
+                      meal_types=None, statuses=None, outputs=None, approximate=False):
+    """
+    analysis_results for the rows matching some predicates, selected through
+    the indexes from build_indexes instead of rescanning and re-merging.
+
+    Orders are filtered on Order Date and sessions on Session Start, over the
+    half-open range [start, end); locations, dishes, meal_types and statuses
+    take one label or a list of labels. `outputs` limits the sections as in
+    analyze_restaurant_data.
+    """
+    from memo import cached_analysis
+
+    arguments = {'locations': locations, 'dishes': dishes, 'meal_types': meal_types, 'statuses': statuses}
+    filters = {FILTER_ARGUMENTS[name]: wanted for name, wanted in arguments.items() if wanted is not None}
+    sections = required_sections(default_sections(indexes['session_orders']['frame']) if outputs is None else outputs)
+    frames = {}
+    with stage('filter', **{name: str(wanted) for name, wanted in filters.items()}):
+        for table, specs in (('session_orders', ORDER_SECTIONS), ('user_sessions', SESSION_SECTIONS)):
+            needed = {section: specs[section] for section in sections if section in specs}
+            if not needed:
+                frames[table] = pd.DataFrame()
+                continue
+            table_index = indexes[table]
+            positions = select_rows(table_index, start=start, end=end, **filters)
+            frames[table] = take_rows(table_index['frame'], positions, section_columns(needed))
+    return cached_analysis(frames['user_sessions'], frames['session_orders'],
+                           approximate=approximate, outputs=sections)
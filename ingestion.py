@@ -0,0 +1,231 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+SHEET_NAMES = ('UserDetails.csv', 'CookingSessions.csv', 'OrderDetails.csv')
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'upliance-analytics')
+
+
+def workbook_digest(content):
+    """
+    Content hash of an Excel workbook, used as the cache key
+    """
+    return hashlib.blake2b(content, digest_size=20).hexdigest()
+
+
+def _sheet_paths(cache_dir, digest):
+    """
+    Arrow IPC file paths for the three sheets of one workbook
+    """
+    folder = os.path.join(cache_dir, digest)
+    return [os.path.join(folder, sheet.replace('.csv', '.arrow')) for sheet in SHEET_NAMES]
+
+
+def _stat_key(path):
+    """
+    Cheap identity of a file on disk, used to skip re-hashing unchanged workbooks
+    """
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _load_stat_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'index.json')) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def _temp_path(path):
+    """
+    A fresh temporary file next to `path`, so concurrent writers never share one
+    """
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    os.close(handle)
+    return tmp_path
+
+
+def _save_stat_index(cache_dir, index):
+    path = os.path.join(cache_dir, 'index.json')
+    tmp_path = _temp_path(path)
+    with open(tmp_path, 'w') as handle:
+        json.dump(index, handle)
+    os.replace(tmp_path, path)
+
+
+def parse_workbook(content):
+    """
+    Parse the three sheets from the raw workbook bytes, opening the workbook once.
+    .xlsx workbooks go through xlsx.read_sheets, which parses the sheets concurrently.
+    """
+    import xlsx
+
+    if xlsx.is_xlsx(content):
+        return xlsx.read_sheets(content, SHEET_NAMES)
+    excel_file = pd.ExcelFile(io.BytesIO(content))
+    return tuple(excel_file.parse(sheet) for sheet in SHEET_NAMES)
+
+
+def write_cache(frames, paths):
+    """
+    Write the sheets as uncompressed Arrow IPC files so they can be memory-mapped
+    """
+    from pyarrow import feather
+
+    os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+    for frame, path in zip(frames, paths):
+        tmp_path = _temp_path(path)
+        try:
+            feather.write_feather(frame, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+def read_cache(paths):
+    """
+    Load the cached sheets memory-mapped
+    """
+    from pyarrow import feather
+
+    return tuple(
+        feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+        for path in paths
+    )
+
+
+def _read_content(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    with open(source, 'rb') as handle:
+        return handle.read()
+
+
+def _lookup_cache(source, cache_dir):
+    """
+    Find cached sheets for a workbook; returns (paths or None, content, stat_key)
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        content = bytes(source)
+        stat_key = None
+        digest = workbook_digest(content)
+    else:
+        content = None
+        stat_key = _stat_key(source)
+        digest = _load_stat_index(cache_dir).get(stat_key)
+
+    if digest is not None:
+        paths = _sheet_paths(cache_dir, digest)
+        if all(os.path.exists(path) for path in paths):
+            return paths, content, stat_key
+    return None, content, stat_key
+
+
+def _populate_cache(source, content, stat_key, cache_dir):
+    """
+    Parse the workbook and cache its sheets; returns (frames, paths or None)
+    """
+    if content is None:
+        content = _read_content(source)
+    frames = parse_workbook(content)
+
+    digest = workbook_digest(content)
+    paths = _sheet_paths(cache_dir, digest)
+    try:
+        if not all(os.path.exists(path) for path in paths):
+            write_cache(frames, paths)
+        if stat_key is not None:
+            index = _load_stat_index(cache_dir)
+            index[stat_key] = digest
+            _save_stat_index(cache_dir, index)
+    except (ImportError, OSError, ValueError, TypeError) as e:
+        # Mixed-type object columns or a missing pyarrow only cost us the cache
+        print(f"Could not cache workbook sheets: {str(e)}")
+        return frames, None
+    return frames, paths
+
+
+def cache_workbook(source, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Make sure a workbook's sheets are cached and return the Arrow IPC file paths
+    """
+    paths, content, stat_key = _lookup_cache(source, cache_dir)
+    if paths is None:
+        _, paths = _populate_cache(source, content, stat_key, cache_dir)
+        if paths is None:
+            raise RuntimeError("Workbook sheets could not be cached")
+    return paths
+
+
+def read_cached_chunks(path, chunksize):
+    """
+    Yield a cached sheet as DataFrames of at most `chunksize` rows, memory-mapped
+    """
+    from pyarrow import feather
+
+    table = feather.read_table(path, memory_map=True)
+    for offset in range(0, table.num_rows, chunksize):
+        yield table.slice(offset, chunksize).to_pandas()
+
+
+def read_workbook_sheets(source, sheets, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Some of the sheets of a workbook: from the cache when it holds them, otherwise
+    parsed straight from an .xlsx without converting the rest of the workbook
+    """
+    import xlsx
+
+    paths, content, _ = _lookup_cache(source, cache_dir)
+    positions = [SHEET_NAMES.index(sheet) for sheet in sheets]
+    if paths is not None:
+        return read_cache([paths[position] for position in positions])
+    if content is None:
+        content = source
+    if xlsx.is_xlsx(content):
+        return xlsx.read_sheets(content, sheets)
+    frames = parse_workbook(_read_content(content))
+    return tuple(frames[position] for position in positions)
+
+
+def iter_workbook_chunks(source, sheet, chunksize, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Yield one sheet of a workbook as DataFrames of at most `chunksize` rows.
+
+    Cached sheets are sliced memory-mapped; otherwise an .xlsx sheet is streamed
+    batch by batch, so the whole sheet is never held in memory.
+    """
+    import xlsx
+
+    paths, content, _ = _lookup_cache(source, cache_dir)
+    if paths is not None:
+        yield from read_cached_chunks(paths[SHEET_NAMES.index(sheet)], chunksize)
+        return
+    if content is None:
+        content = source
+    if xlsx.is_xlsx(content):
+        yield from xlsx.iter_sheet_batches(xlsx.open_workbook(content), sheet, chunksize)
+        return
+    yield from read_cached_chunks(cache_workbook(source, cache_dir)[SHEET_NAMES.index(sheet)], chunksize)
+
+
+def read_workbook(source, cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+    """
+    Read UserDetails, CookingSessions and OrderDetails from a workbook path or bytes.
+
+    The first read converts the sheets to Arrow IPC files keyed on the workbook's
+    content hash; later reads of the same content load them memory-mapped.
+    """
+    if not use_cache:
+        return parse_workbook(_read_content(source))
+
+    paths, content, stat_key = _lookup_cache(source, cache_dir)
+    if paths is not None:
+        return read_cache(paths)
+    frames, _ = _populate_cache(source, content, stat_key, cache_dir)
+    return frames
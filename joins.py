@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+
+def index_table(table, on):
+    """
+    Index a lookup table by its join key once, for any number of later joins
+    """
+    return {'table': table, 'on': on, 'index': pd.Index(table[on])}
+
+
+def _is_arrow(values):
+    return getattr(values.dtype, 'storage', None) == 'pyarrow'
+
+
+def resolve_positions(indexed, keys):
+    """
+    Row position in the lookup table of every key, -1 where there is no match
+    """
+    lookup_keys = indexed['table'][indexed['on']]
+    if _is_arrow(lookup_keys) and _is_arrow(keys):
+        # Hashing Arrow strings natively avoids a round trip through Python objects
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        value_set = pa.array(lookup_keys.array)
+        if isinstance(value_set, pa.ChunkedArray):
+            value_set = value_set.combine_chunks()
+        positions = pc.index_in(pa.array(keys.array), value_set=value_set)
+        return positions.fill_null(-1).to_numpy().astype(np.intp)
+    return indexed['index'].get_indexer(keys).astype(np.intp)
+
+
+class JoinedFrame:
+    """
+    Lazy result of a left join of `base` onto an indexed lookup table.
+
+    Base rows are resolved to integer row positions of the lookup once, the
+    first time a lookup column is read; columns are only gathered (and cached)
+    when read. Column names follow pd.merge, including the _x/_y suffixes for
+    names present on both sides.
+    """
+
+    def __init__(self, base, indexed, suffixes=('_x', '_y')):
+        self.base = base
+        self.indexed = indexed
+        self.lookup = indexed['table']
+        self.on = indexed['on']
+        self._positions = None
+        self.index = pd.RangeIndex(len(base))
+        self._derived = {}
+
+        shared = set(base.columns) & set(self.lookup.columns) - {self.on}
+        self._sources = {}
+        for column in base.columns:
+            self._sources[column + suffixes[0] if column in shared else column] = ('base', column)
+        for column in self.lookup.columns:
+            if column != self.on:
+                self._sources[column + suffixes[1] if column in shared else column] = ('lookup', column)
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = resolve_positions(self.indexed, self.base[self.on])
+        return self._positions
+
+    @property
+    def columns(self):
+        return pd.Index(list(self._sources) + [name for name in self._derived if name not in self._sources])
+
+    @property
+    def shape(self):
+        return len(self), len(self.columns)
+
+    def __len__(self):
+        return len(self.base)
+
+    def __contains__(self, name):
+        return name in self._sources or name in self._derived
+
+    def __getitem__(self, name):
+        if name in self._derived:
+            return self._derived[name]
+        if name not in self._sources:
+            raise KeyError(name)
+        side, column = self._sources[name]
+        if side == 'base':
+            values = self.base[column].array
+        else:
+            values = pd.api.extensions.take(self.lookup[column].array, self.positions, allow_fill=True)
+        self._derived[name] = pd.Series(values, index=self.index, name=name)
+        return self._derived[name]
+
+    def __setitem__(self, name, values):
+        self._derived[name] = pd.Series(values, index=self.index, name=name)
+
+    def to_frame(self, columns=None):
+        """
+        Materialize the join (or just the given columns) as a DataFrame
+        """
+        columns = list(self.columns) if columns is None else list(columns)
+        return pd.DataFrame({column: self[column] for column in columns}, index=self.index)
+
+
+def lazy_join(base, indexed, suffixes=('_x', '_y')):
+    """
+    Left join `base` onto an indexed lookup table without copying lookup columns.
+
+    Falls back to a materialized pd.merge when the lookup key is not unique,
+    since duplicate keys multiply base rows.
+    """
+    if not indexed['index'].is_unique:
+        return pd.merge(base, indexed['table'], on=indexed['on'], how='left', suffixes=suffixes)
+    return JoinedFrame(base, indexed, suffixes=suffixes)
@@ -0,0 +1,116 @@
+import os
+import sys
+
+from profiling import stage
+
+# Names of the three datasets, both as workbook sheets and as CSV file names
+DATASET_FILES = ('UserDetails.csv', 'CookingSessions.csv', 'OrderDetails.csv')
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+
+
+def read_workbook_file(path, **options):
+    """
+    Read the three datasets from a local Excel workbook
+    """
+    from ingestion import read_workbook
+    return read_workbook(path, **options)
+
+
+def read_csv_directory(path, **options):
+    """
+    Read UserDetails.csv, CookingSessions.csv and OrderDetails.csv from a directory
+    """
+    import pandas as pd
+
+    missing = [name for name in DATASET_FILES if not os.path.exists(os.path.join(path, name))]
+    if missing:
+        raise FileNotFoundError(f"Missing dataset files in {path}: {', '.join(missing)}")
+    return tuple(pd.read_csv(os.path.join(path, name), **options) for name in DATASET_FILES)
+
+
+def read_stream(stream, **options):
+    """
+    Read the three datasets from a binary stream holding an Excel workbook (e.g. stdin)
+    """
+    from ingestion import read_workbook
+
+    content = stream.read()
+    if isinstance(content, str):
+        raise TypeError("Workbook streams must be opened in binary mode")
+    return read_workbook(content, **options)
+
+
+SOURCES = {
+    'workbook': read_workbook_file,
+    'csv_dir': read_csv_directory,
+    'stream': read_stream,
+}
+
+
+def register_source(kind, reader):
+    """
+    Register a reader returning (user_details, cooking_sessions, order_details) for a source kind
+    """
+    SOURCES[kind] = reader
+
+
+def detect_source_kind(source):
+    """
+    Work out which registered reader handles a source
+    """
+    if source == '-' or hasattr(source, 'read'):
+        return 'stream'
+    source = os.fspath(source)
+    if os.path.isdir(source):
+        return 'csv_dir'
+    if source.lower().endswith(WORKBOOK_EXTENSIONS):
+        return 'workbook'
+    raise ValueError(f"Cannot tell how to load data from {source!r}")
+
+
+def load_datasets(source, kind=None, **options):
+    """
+    Load the three datasets without any interactive upload.
+
+    `source` may be a workbook path, a directory of the three CSV files,
+    a binary stream, or '-' for stdin. Pass `kind` to pick a reader explicitly.
+    """
+    kind = kind or detect_source_kind(source)
+    if kind not in SOURCES:
+        raise ValueError(f"Unknown source kind: {kind}")
+    if source == '-':
+        source = sys.stdin.buffer
+    with stage('load', kind=kind) as record:
+        return record.output(SOURCES[kind](source, **options))
+
+
+def load_lookup_tables(source, kind=None, **options):
+    """
+    Load only UserDetails and CookingSessions, leaving OrderDetails on disk
+    """
+    kind = kind or detect_source_kind(source)
+    if kind == 'csv_dir':
+        import pandas as pd
+        return tuple(pd.read_csv(os.path.join(source, name), **options) for name in DATASET_FILES[:2])
+    if kind == 'workbook':
+        from ingestion import read_workbook_sheets
+        return read_workbook_sheets(source, DATASET_FILES[:2], **options)
+    user_details, cooking_sessions, _ = load_datasets(source, kind=kind, **options)
+    return user_details, cooking_sessions
+
+
+def iter_order_chunks(source, chunksize=100_000, kind=None, **options):
+    """
+    Yield OrderDetails in DataFrames of at most `chunksize` rows
+    """
+    kind = kind or detect_source_kind(source)
+    if kind == 'csv_dir':
+        import pandas as pd
+        yield from pd.read_csv(os.path.join(source, DATASET_FILES[2]), chunksize=chunksize, **options)
+    elif kind == 'workbook':
+        from ingestion import iter_workbook_chunks
+        yield from iter_workbook_chunks(source, DATASET_FILES[2], chunksize, **options)
+    else:
+        _, _, order_details = load_datasets(source, kind=kind, **options)
+        for offset in range(0, len(order_details), chunksize):
+            yield order_details.iloc[offset:offset + chunksize]
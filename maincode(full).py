@@ -8,7 +8,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from google.colab import files
-import io
+from ingestion import read_workbook
 
 def upload_and_read_data():
     try:
@@ -16,12 +16,8 @@ def upload_and_read_data():
         uploaded = files.upload()
         print("File uploaded successfully!")
 
-        excel_file = io.BytesIO(list(uploaded.values())[0])
-
         print("Reading sheets from the Excel file...")
-        user_details = pd.read_excel(excel_file, sheet_name='UserDetails.csv')
-        cooking_sessions = pd.read_excel(excel_file, sheet_name='CookingSessions.csv')
-        order_details = pd.read_excel(excel_file, sheet_name='OrderDetails.csv')
+        user_details, cooking_sessions, order_details = read_workbook(list(uploaded.values())[0])
         print("Sheets read successfully!")
 
         return user_details, cooking_sessions, order_details
@@ -262,7 +258,6 @@ def generate_business_insights(analysis_results):
     print("- Focus marketing on age groups with lower engagement.")
     print("- Consider loyalty programs to increase average orders per user.")
     print("- Investigate locations with lower ratings for improvement opportunities.")
-results = analyze_restaurant_data(user_sessions, session_orders)
 generate_business_insights(results)
 
 import plotly.express as px
@@ -302,8 +297,6 @@ def plot_top_dishes(dish_analysis):
     fig.update_layout(height=500)
     return fig
 
-# Call analyze_restaurant_data to get results and assign to 'results'
-results = analyze_restaurant_data(user_sessions, session_orders)
 # Use 'results' to access the 'dish_analysis' data for plotting
 dishes_plot = plot_top_dishes(results['dish_analysis'])
 dishes_plot.show()
@@ -367,12 +360,10 @@ def visualize_revenue_patterns(analysis_results):
     fig.update_layout(height=500, title_text="Revenue Patterns")
     fig.show()
 
-# Call analyze_restaurant_data to get results and assign to 'results'
-results = analyze_restaurant_data(user_sessions, session_orders)
 # Pass 'results' to visualize_revenue_patterns
 visualize_revenue_patterns(results) # This line was changed
 
-def visualize_menu_performance(session_orders):
+def visualize_menu_performance(analysis_results):
     """
     Create visualizations for menu performance insights.
     """
@@ -387,14 +378,11 @@ def visualize_menu_performance(session_orders):
     )
 
     # Top Dishes
-    dish_metrics = session_orders.groupby('Dish Name_x').agg({
-        'Amount (USD)': 'sum',
-        'Rating': 'mean'
-    }).sort_values('Amount (USD)', ascending=False)
+    dish_metrics = analysis_results['dish_analysis'].sort_values(('Amount (USD)', 'sum'), ascending=False)
 
     fig.add_trace(
         go.Bar(
-            x=dish_metrics.head()['Amount (USD)'],
+            x=dish_metrics.head()[('Amount (USD)', 'sum')],
             y=dish_metrics.head().index,
             orientation='h',
             name='Revenue'
@@ -403,7 +391,7 @@ def visualize_menu_performance(session_orders):
     )
 
     # Ratings by Meal Type
-    meal_ratings = session_orders.groupby('Meal Type_x')['Rating'].mean()
+    meal_ratings = analysis_results['meal_analysis'][('Rating', 'mean')]
     fig.add_trace(
         go.Bar(
             x=meal_ratings.index,
@@ -414,7 +402,7 @@ def visualize_menu_performance(session_orders):
     )
 
     # Average Order Value
-    avg_order = session_orders.groupby('Meal Type_x')['Amount (USD)'].mean()
+    avg_order = analysis_results['meal_analysis'][('Amount (USD)', 'mean')]
     fig.add_trace(
         go.Bar(
             x=avg_order.index,
@@ -425,7 +413,7 @@ def visualize_menu_performance(session_orders):
     )
 
     # Order Volume by Time
-    time_orders = session_orders.groupby('Time of Day')['Order ID'].count()
+    time_orders = analysis_results['time_analysis'][('Order ID', 'count')]
     fig.add_trace(
         go.Scatter(
             x=time_orders.index,
@@ -439,7 +427,7 @@ def visualize_menu_performance(session_orders):
     fig.update_layout(height=1000, title_text="Menu Performance Analysis")
     fig.show()
 print("\n4. Menu Performance")
-visualize_menu_performance(session_orders)
+visualize_menu_performance(results)
 
 def visualize_customer_insights(user_sessions):
     """
@@ -506,16 +494,12 @@ def visualize_customer_insights(user_sessions):
 print("\n2. Customer Insights")
 visualize_customer_insights(user_sessions)
 
-def visualize_location_performance(user_sessions):
+def visualize_location_performance(analysis_results):
     """
     Create visualizations for location-based insights.
     """
     # Location Performance Overview
-    location_metrics = user_sessions.groupby('Location').agg({
-        'User ID': 'nunique',
-        'Total Orders': ['sum', 'mean'],
-        'Session Rating': 'mean'
-    }).round(2)
+    location_metrics = analysis_results['location_metrics']
 
     fig = make_subplots(
         rows=2, cols=1,
@@ -560,4 +544,4 @@ def visualize_location_performance(user_sessions):
     fig.update_layout(height=800, title_text="Location Performance Analysis")
     fig.show()
 print("\n3. Location Performance")
-visualize_location_performance(user_sessions)
+visualize_location_performance(results)
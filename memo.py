@@ -0,0 +1,125 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from aggregates import (
+    ORDER_SECTIONS,
+    SESSION_SECTIONS,
+    approximate_options,
+    default_sections,
+    section_columns,
+)
+from graph import required_sections
+
+# Number of analysis_results kept before the least recently used one is dropped
+RESULTS_CACHE_SIZE = 8
+
+_results = OrderedDict()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def analysis_inputs():
+    """
+    The columns analyze_restaurant_data reads from (user_sessions, session_orders)
+    """
+    return section_columns(SESSION_SECTIONS), section_columns(ORDER_SECTIONS)
+
+
+def _update_digest(digest, values):
+    """
+    Feed a column's raw buffers to the digest without converting its values
+    """
+    dtype = getattr(values, 'dtype', None)
+    digest.update(f"{len(values)}:{dtype}".encode())
+    if isinstance(dtype, pd.CategoricalDtype):
+        _update_digest(digest, values.cat.codes)
+        _update_digest(digest, pd.Series(values.cat.categories))
+    elif getattr(dtype, 'storage', None) == 'pyarrow' or isinstance(dtype, pd.ArrowDtype):
+        import pyarrow as pa
+
+        array = pa.array(values.array)
+        for chunk in getattr(array, 'chunks', [array]):
+            digest.update(f"{chunk.offset}:{len(chunk)}".encode())
+            for buffer in chunk.buffers():
+                if buffer is not None:
+                    digest.update(memoryview(buffer))
+    elif isinstance(values.array, pd.arrays.NumpyExtensionArray) and values.dtype != object:
+        digest.update(memoryview(np.ascontiguousarray(values.to_numpy())).cast('B'))
+    elif isinstance(values.array, pd.api.extensions.ExtensionArray) and hasattr(values.dtype, 'numpy_dtype'):
+        # Nullable integers and booleans: the validity mask, then the filled values
+        digest.update(np.packbits(values.isna().to_numpy()).tobytes())
+        digest.update(values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0).tobytes())
+    else:
+        digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+
+
+def frame_fingerprint(frame, columns):
+    """
+    Content hash of the given columns of a DataFrame (or JoinedFrame)
+    """
+    # SHA-256 is hardware accelerated on most CPUs, over twice as fast as BLAKE2 here
+    digest = hashlib.sha256()
+    for column in columns:
+        digest.update(column.encode())
+        if column in frame:
+            _update_digest(digest, frame[column])
+    return digest.hexdigest()
+
+
+def analysis_key(user_sessions, session_orders, approximate=False, outputs=None):
+    """
+    Cache key of an analysis: fingerprints of the columns it reads, its sketch settings
+    and the sections asked for
+    """
+    session_columns, order_columns = analysis_inputs()
+    return (
+        frame_fingerprint(user_sessions, session_columns),
+        frame_fingerprint(session_orders, order_columns),
+        repr(sorted((approximate_options(approximate) or {}).items())),
+        tuple(required_sections(default_sections(session_orders) if outputs is None else outputs)),
+    )
+
+
+def cached_analysis(user_sessions, session_orders, approximate=False, workers=None, outputs=None):
+    """
+    analyze_restaurant_data, computed once per distinct input content.
+
+    Results are kept in an LRU of RESULTS_CACHE_SIZE entries keyed by
+    analysis_key, so every chart and the insights can ask for analysis_results
+    and share one computation. Unlike analyze_restaurant_data it never adds
+    Age_Group to user_sessions (call add_age_group for the session plots).
+    The returned dict is shared between callers and should not be modified.
+    """
+    from analysis import analyze_restaurant_data
+
+    sections = required_sections(default_sections(session_orders) if outputs is None else outputs)
+    key = analysis_key(user_sessions, session_orders, approximate, sections)
+    if key in _results:
+        _stats['hits'] += 1
+        _results.move_to_end(key)
+        return _results[key]
+
+    _stats['misses'] += 1
+    _results[key] = analyze_restaurant_data(
+        user_sessions, session_orders, approximate=approximate, workers=workers, outputs=sections
+    )
+    while len(_results) > RESULTS_CACHE_SIZE:
+        _results.popitem(last=False)
+    return _results[key]
+
+
+def cache_info():
+    """
+    Hits, misses and current size of the analysis cache
+    """
+    return {**_stats, 'size': len(_results), 'maxsize': RESULTS_CACHE_SIZE}
+
+
+def clear_cache():
+    """
+    Drop every cached analysis and reset the counters
+    """
+    _results.clear()
+    _stats.update(hits=0, misses=0)
@@ -0,0 +1,107 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aggregates import (
+    ORDER_SECTIONS,
+    SESSION_SECTIONS,
+    aggregate_sections,
+    default_sections,
+    finalize_analysis,
+    merge_partials,
+    section_columns,
+)
+from topk import heavy_hitters, merge_heavy_hitters, ranking_columns
+
+# Shards live in shared memory where the OS provides it, so workers map them without copies
+SHARED_MEMORY_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def shard_ids(user_ids, shards):
+    """
+    Shard number of each row from a stable hash of its User ID
+    """
+    hashes = pd.util.hash_pandas_object(pd.Series(user_ids), index=False).to_numpy()
+    return (hashes % np.uint64(shards)).astype(np.intp)
+
+
+def write_shards(frame, columns, user_column, shards, path):
+    """
+    Write the needed columns to one Arrow IPC file, rows grouped by shard.
+
+    Returns the (offset, length) of every shard inside the file.
+    """
+    from pyarrow import feather
+
+    shard = shard_ids(frame[user_column], shards)
+    order = np.argsort(shard, kind='stable')
+    bounds = np.searchsorted(shard[order], np.arange(shards + 1))
+    table = pd.DataFrame({column: frame[column] for column in columns}).take(order).reset_index(drop=True)
+    feather.write_feather(table, path, compression='uncompressed')
+    return [(int(bounds[i]), int(bounds[i + 1] - bounds[i])) for i in range(shards)]
+
+
+def aggregate_shard(path, offset, length, sections, approximate, table=None, topk=False):
+    """
+    Worker: memory-map one shard of a table and compute its partial aggregates,
+    plus its heavy-hitter sketches under 'heavy_hitters' with `topk`
+    """
+    from pyarrow import feather
+
+    shard = feather.read_table(path, memory_map=True).slice(offset, length).to_pandas()
+    partials = aggregate_sections(shard, sections, approximate=approximate)
+    if topk:
+        partials['heavy_hitters'] = heavy_hitters(shard, table, topk)
+    return partials
+
+
+def analyze_parallel(user_sessions, session_orders, workers=None, shards=None, approximate=False, sections=None,
+                     topk=False):
+    """
+    analyze_restaurant_data across a process pool.
+
+    Both tables are sharded by a hash of User ID and written once to memory-mapped
+    Arrow files; each worker aggregates its shards and only the small partial
+    aggregates travel back to be merged into analysis_results. `sections` limits
+    the work to those sections; a table none of them reads is not written at all.
+    With `topk`, the per-shard heavy-hitter sketches are merged into
+    analysis_results['heavy_hitters'].
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers
+    sections = default_sections(session_orders) if sections is None else sections
+
+    tables = [
+        ('session_orders', session_orders, 'User ID_x', ORDER_SECTIONS),
+        ('user_sessions', user_sessions, 'User ID', SESSION_SECTIONS),
+    ]
+    partials = {}
+    with tempfile.TemporaryDirectory(dir=SHARED_MEMORY_DIR) as directory:
+        jobs = []
+        for name, frame, user_column, table_sections in tables:
+            sections_here = {section: table_sections[section] for section in sections if section in table_sections}
+            if not sections_here and not topk:
+                continue
+            path = os.path.join(directory, f"{name}.arrow")
+            columns = section_columns(sections_here)
+            if topk:
+                columns += [column for column in ranking_columns(name) if column not in columns]
+            for offset, length in write_shards(frame, columns, user_column, shards, path):
+                jobs.append((path, offset, length, sections_here, approximate, name, topk))
+
+        hitters = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(aggregate_shard, *job) for job in jobs]
+            for future in futures:
+                shard_partials = future.result()
+                hitters = merge_heavy_hitters(hitters, shard_partials.pop('heavy_hitters', {}))
+                for section, partial in shard_partials.items():
+                    partials[section] = partial if section not in partials else merge_partials(partials[section], partial)
+
+    analysis_results = finalize_analysis(partials)
+    if topk:
+        analysis_results['heavy_hitters'] = hitters
+    return analysis_results
@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Formats tried when guessing from the sample fails; the first that parses most of the sample wins
+COMMON_DATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y',
+    '%d-%m-%Y',
+    '%Y/%m/%d',
+)
+FORMAT_SAMPLE_SIZE = 1000
+# Parse distinct values only when a sample has fewer than this share of distinct values
+REPEATED_RATIO = 0.5
+
+
+def _uniques(values):
+    """
+    Integer code of every value (-1 for missing) and the distinct values
+    """
+    codes, uniques = pd.factorize(values)
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def _broadcast(parsed_uniques, codes, index, name):
+    """
+    Spread per-unique results back to every row
+    """
+    return pd.Series(pd.api.extensions.take(parsed_uniques, codes, allow_fill=True), index=index, name=name)
+
+
+def _sample(values, sample_size):
+    """
+    Evenly spaced sample of the non-missing values
+    """
+    return values.iloc[::max(1, len(values) // sample_size)].dropna()[:sample_size]
+
+
+def detect_date_format(sample):
+    """
+    strftime format that parses the most of a sample of strings, or None
+    """
+    strings = [value for value in sample if isinstance(value, str)]
+    if not strings:
+        return None
+    candidates = [guess_datetime_format(strings[0])] + list(COMMON_DATE_FORMATS)
+    best, best_parsed = None, 0
+    for candidate in dict.fromkeys(candidate for candidate in candidates if candidate):
+        parsed = pd.to_datetime(pd.Index(strings), format=candidate, errors='coerce').notna().sum()
+        if parsed > best_parsed:
+            best, best_parsed = candidate, parsed
+        if parsed == len(strings):
+            break
+    return best
+
+
+def _parse_dates(values, date_format):
+    """
+    DatetimeArray of values parsed with one format, NaT where they do not match
+    """
+    if date_format is not None and getattr(values.dtype, 'storage', None) == 'pyarrow':
+        # Arrow parses in C without the GIL, so concurrent columns really run in parallel
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        parsed = pc.strptime(pa.array(values.array), format=date_format, unit='us', error_is_null=True)
+        return pd.array(parsed.to_numpy(zero_copy_only=False))
+    return pd.to_datetime(pd.Index(values), format=date_format, errors='coerce').array.copy()
+
+
+def _unparsed(parsed, targets):
+    """
+    Positions that came out NaT although the input held a value (blank strings count as missing)
+    """
+    empty = np.flatnonzero(parsed.isna())
+    inputs = targets.iloc[empty]
+    held = inputs.notna() & (inputs.astype(str).str.strip() != '')
+    return empty[held.to_numpy()]
+
+
+def parse_datetime_column(values, sample_size=FORMAT_SAMPLE_SIZE):
+    """
+    Parse a column to datetimes, returning (parsed, failures).
+
+    Columns that already hold datetimes are returned unchanged. Otherwise the
+    format is detected once from a sample and every value is parsed with it;
+    when the sample shows repeated values, only the distinct values are parsed
+    and broadcast back to every row. Values the detected format misses get one
+    more try with per-value inference; whatever still fails becomes NaT and is
+    returned in `failures` (raw values indexed by row).
+    """
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values, values.iloc[:0]
+
+    sample = _sample(values, sample_size)
+    date_format = detect_date_format(sample)
+    codes = None
+    targets = values
+    if len(sample) and pd.Series(sample).nunique() < len(sample) * REPEATED_RATIO:
+        codes, uniques = _uniques(values)
+        targets = pd.Series(uniques, dtype=values.dtype if uniques.size else object)
+
+    parsed = _parse_dates(targets, date_format)
+    missed = _unparsed(parsed, targets)
+    if date_format is not None and len(missed):
+        retried = pd.to_datetime(pd.Index(targets.to_numpy()[missed]), format='mixed', errors='coerce')
+        parsed[missed] = retried.as_unit(parsed.unit).array
+        missed = _unparsed(parsed, targets)
+
+    if codes is None:
+        return pd.Series(parsed, index=values.index, name=values.name), values.iloc[missed]
+    return _broadcast(parsed, codes, values.index, values.name), values[np.isin(codes, missed)]
+
+
+def parse_numeric_column(values, dtype=float):
+    """
+    Parse a column to numbers, returning (parsed, failures).
+
+    Numeric columns are returned unchanged; text columns are converted one
+    distinct value at a time and unparseable entries come back as NaN and in
+    `failures`.
+    """
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values, values.iloc[:0]
+
+    codes, uniques = _uniques(values)
+    parsed = pd.to_numeric(pd.Series(uniques), errors='coerce').to_numpy(dtype=float)
+    failures = values[np.isin(codes, np.flatnonzero(np.isnan(parsed)))]
+    return _broadcast(parsed, codes, values.index, values.name).astype(dtype, copy=False), failures
+
+
+def parse_datetime_columns(columns, workers=None, report=None):
+    """
+    Parse several (frame, column) pairs concurrently, assigning each result back.
+
+    Columns that already hold datetimes (e.g. parsed earlier by clean_data) are
+    skipped. Failed values of every column are added to `report` under the column name.
+    """
+    columns = [(frame, column) for frame, column in columns
+               if not pd.api.types.is_datetime64_any_dtype(frame[column].dtype)]
+    if not columns:
+        return report
+    with ThreadPoolExecutor(max_workers=workers or len(columns) or 1) as pool:
+        results = list(pool.map(lambda item: parse_datetime_column(item[0][item[1]]), columns))
+    for (frame, column), (parsed, failures) in zip(columns, results):
+        frame[column] = parsed
+        if report is not None and len(failures):
+            report[column] = failures
+    return report
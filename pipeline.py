@@ -0,0 +1,68 @@
+import argparse
+import importlib
+
+from loaders import load_datasets
+
+
+def load_preprocessing():
+    """
+    Import data-preprocessing.py, whose file name is not a valid module identifier
+    """
+    return importlib.import_module('data-preprocessing')
+
+
+def run_pipeline(source, kind=None, compact=False, **options):
+    """
+    Load, clean, merge and analyse the datasets from a source without user interaction
+    """
+    from aggregates import add_age_group
+    from memo import cached_analysis
+
+    preprocessing = load_preprocessing()
+    user_details, cooking_sessions, order_details = load_datasets(source, kind=kind, **options)
+    user_details, cooking_sessions, order_details = preprocessing.clean_data(
+        user_details, cooking_sessions, order_details, compact=compact
+    )[:3]
+    user_sessions, session_orders = preprocessing.merge_data(
+        user_details, cooking_sessions, order_details
+    )
+    # Age_Group stays on user_sessions for the session plots
+    add_age_group(user_sessions)
+    analysis_results = cached_analysis(user_sessions, session_orders)
+    return user_sessions, session_orders, analysis_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the upliance analysis pipeline headlessly")
+    parser.add_argument('source', help="Workbook path, directory of CSV files, or '-' for a workbook on stdin")
+    parser.add_argument('--kind', help="Source kind (workbook, csv_dir, stream)")
+    parser.add_argument('--compact', action='store_true', help="Store the cleaned data with the compact schema")
+    parser.add_argument('--profile', help="Write per-stage timings and memory as JSON to this path")
+    parser.add_argument('--trace', help="Write the stages as Chrome trace events to this path")
+    parser.add_argument('--trace-allocations', action='store_true', help="Measure peak allocations per stage (slower)")
+    parser.add_argument('--sample-interval', type=float, help="Sample the Python stack every this many seconds")
+    parser.add_argument('--stacks', help="Write the sampled stacks in collapsed format to this path")
+    args = parser.parse_args(argv)
+
+    from analysis import generate_business_insights
+    from profiling import profile
+
+    with profile(trace_allocations=args.trace_allocations, sample_interval=args.sample_interval) as profiler:
+        _, _, analysis_results = run_pipeline(args.source, kind=args.kind, compact=args.compact)
+        insights = generate_business_insights(analysis_results)
+    for insight in insights:
+        print(f"\n{insight['category']}: {insight['key_finding']}")
+        for metric, value in insight['metrics'].items():
+            print(f"  * {metric}: {value}")
+
+    if args.profile:
+        profiler.write_json(args.profile)
+    if args.trace:
+        profiler.write_trace(args.trace)
+    if args.stacks and profiler.sampler:
+        with open(args.stacks, 'w') as handle:
+            handle.write(profiler.sampler.collapsed())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import collections
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# Profiler collecting stage records, set while a `profile()` block runs
+_active = None
+
+
+def count_rows(value):
+    """
+    Rows across the tables in a value (a frame, or a tuple of frames)
+    """
+    tables = value if isinstance(value, (tuple, list)) else (value,)
+    counts = [len(table) for table in tables if hasattr(table, 'columns')]
+    return sum(counts) if counts else None
+
+
+def _bytes(value):
+    """
+    Shallow memory footprint of the DataFrames in a value
+    """
+    tables = value if isinstance(value, (tuple, list)) else (value,)
+    sizes = [int(table.memory_usage(index=True).sum()) for table in tables if hasattr(table, 'memory_usage')]
+    return sum(sizes) if sizes else None
+
+
+def _rss_bytes():
+    """
+    Current resident set size, from /proc where available
+    """
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _max_rss_bytes():
+    """
+    Peak resident set size so far, or None where the resource module is missing (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class StageRecord:
+    """
+    Measurements of one running stage; `output(value)` records what it produced
+    """
+
+    def __init__(self, name, inputs=None, **args):
+        self.name = name
+        self.args = args
+        self.rows_in = count_rows(inputs) if inputs is not None else None
+        self.bytes_in = _bytes(inputs) if inputs is not None else None
+        self.rows_out = None
+        self.bytes_out = None
+
+    def output(self, value):
+        self.rows_out = count_rows(value)
+        self.bytes_out = _bytes(value)
+        return value
+
+
+class _NullRecord:
+    """
+    Stand-in record used when no profiler is active
+    """
+
+    def output(self, value):
+        return value
+
+
+_NULL_RECORD = _NullRecord()
+
+
+class Sampler:
+    """
+    Background thread sampling the Python stack of one thread at a fixed interval.
+
+    Counts are kept per collapsed stack ("outer;inner;leaf"), the input format of
+    flame graph tools.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """
+        Samples as collapsed-stack lines, most frequent first
+        """
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """
+    Records wall time, CPU time, memory and rows in/out of every stage run while it is active.
+
+    With `trace_allocations`, tracemalloc also measures the peak Python
+    allocations of each stage (nested stages included), at a sizeable slowdown.
+    """
+
+    def __init__(self, trace_allocations=False):
+        self.trace_allocations = trace_allocations
+        self.records = []
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _fold_peak(self):
+        """
+        Charge the allocation peak since the last reset to every open stage, then reset it
+        """
+        _, peak = tracemalloc.get_traced_memory()
+        for entry in self._stack():
+            entry['peak'] = max(entry['peak'], peak)
+        tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def stage(self, name, inputs=None, **args):
+        record = StageRecord(name, inputs, **args)
+        stack = self._stack()
+        if self.trace_allocations:
+            self._fold_peak()
+        entry = {'peak': 0}
+        stack.append(entry)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+            if self.trace_allocations:
+                self._fold_peak()
+            stack.pop()
+            event = {
+                'stage': name,
+                'start_s': start - self.origin,
+                'wall_s': wall,
+                'cpu_s': cpu,
+                'depth': len(stack),
+                'thread': threading.get_ident(),
+                'rows_in': record.rows_in,
+                'rows_out': record.rows_out,
+                'bytes_in': record.bytes_in,
+                'bytes_out': record.bytes_out,
+                'rss_bytes': _rss_bytes(),
+                'max_rss_bytes': _max_rss_bytes(),
+            }
+            if self.trace_allocations:
+                event['peak_alloc_bytes'] = entry['peak']
+            if record.args:
+                event['args'] = record.args
+            self.records.append(event)
+
+    def to_json(self):
+        """
+        Stage records in start order, as a JSON-serialisable dict
+        """
+        return {'stages': sorted(self.records, key=lambda event: event['start_s'])}
+
+    def to_trace_events(self):
+        """
+        Stage records in Chrome trace-event format (chrome://tracing, Perfetto)
+        """
+        events = []
+        for event in self.records:
+            args = {key: value for key, value in event.items()
+                    if key not in ('stage', 'start_s', 'wall_s', 'thread', 'depth', 'args') and value is not None}
+            args.update(event.get('args', {}))
+            events.append({
+                'name': event['stage'],
+                'cat': event['stage'].split('.')[0],
+                'ph': 'X',
+                'ts': event['start_s'] * 1e6,
+                'dur': event['wall_s'] * 1e6,
+                'pid': os.getpid(),
+                'tid': event['thread'],
+                'args': args,
+            })
+        return {'traceEvents': sorted(events, key=lambda event: event['ts']), 'displayTimeUnit': 'ms'}
+
+    def write_json(self, path):
+        with open(path, 'w') as handle:
+            json.dump(self.to_json(), handle, indent=2, default=str)
+
+    def write_trace(self, path):
+        with open(path, 'w') as handle:
+            json.dump(self.to_trace_events(), handle, default=str)
+
+
+@contextlib.contextmanager
+def profile(trace_allocations=False, sample_interval=None):
+    """
+    Activate a Profiler for the enclosed block and yield it.
+
+    With `sample_interval` (seconds), a Sampler records the calling thread's
+    stack as well and is available as `profiler.sampler`.
+    """
+    global _active
+    profiler = Profiler(trace_allocations=trace_allocations)
+    profiler.sampler = Sampler(sample_interval) if sample_interval else None
+    previous, _active = _active, profiler
+    started_tracing = trace_allocations and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if profiler.sampler:
+        profiler.sampler.start()
+    try:
+        yield profiler
+    finally:
+        if profiler.sampler:
+            profiler.sampler.stop()
+        if started_tracing:
+            tracemalloc.stop()
+        _active = previous
+
+
+def stage(name, inputs=None, **args):
+    """
+    Measure a pipeline stage if a profiler is active; a no-op otherwise.
+
+    `inputs` (a frame or tuple of frames) sets rows_in/bytes_in, and
+    `record.output(value)` inside the block sets rows_out/bytes_out.
+    """
+    if _active is None:
+        return contextlib.nullcontext(_NULL_RECORD)
+    return _active.stage(name, inputs, **args)
+
+
+def profiled(name):
+    """
+    Decorator running a function as a stage, with its frame arguments as inputs
+    and its return value as output
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with stage(name, inputs=args) as record:
+                return record.output(function(*args, **kwargs))
+        return wrapper
+    return decorate
@@ -0,0 +1,289 @@
+import argparse
+import hashlib
+import html
+import importlib.util
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from graph import CONSUMERS, FIGURE_INPUTS
+
+DEFAULT_FIGURE_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'upliance-analytics', 'figures')
+
+# Formats a report can be exported to; everything but html is a static image (needs kaleido)
+REPORT_FORMATS = ('html', 'png', 'svg', 'pdf', 'jpeg', 'webp')
+
+# user_sessions columns read by the figures drawn from session rows
+SESSION_FIGURE_COLUMNS = ['Duration (mins)', 'Session Rating', 'Age_Group']
+
+# plotly.js is written once at the root of the output directory and shared by every pack
+PLOTLYJS_FILE = 'plotly.min.js'
+
+REPORT_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="{plotlyjs}"></script>
+</head>
+<body>
+<h1>{title}</h1>
+{figures}
+</body>
+</html>
+"""
+
+
+def _pack_folder(pack):
+    return re.sub(r'[^\w.-]+', '_', str(pack)).strip('_') or 'report'
+
+
+def _renderer_version():
+    """
+    Hash of visualization.py, so cached figures are redrawn when the plotting code changes
+    """
+    import visualization
+
+    with open(visualization.__file__, 'rb') as handle:
+        return hashlib.sha256(handle.read()).hexdigest()
+
+
+def _update_digest(digest, value):
+    """
+    Feed a figure input (a DataFrame, or a dict of metrics) to the digest
+    """
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((list(value.columns), list(value.index.names), [str(dtype) for dtype in value.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+
+def figure_data(name, analysis_results, user_sessions=None):
+    """
+    The input a figure function is called with
+    """
+    source = FIGURE_INPUTS[name]
+    if source == 'user_sessions':
+        if user_sessions is None:
+            raise ValueError(f"{name} needs user_sessions")
+        return user_sessions[[column for column in SESSION_FIGURE_COLUMNS if column in user_sessions]]
+    if source == 'analysis_results':
+        return {section: analysis_results[section] for section in CONSUMERS[name]}
+    return analysis_results[source]
+
+
+def figure_key(name, data, options=None, version=None):
+    """
+    Cache key of a figure: its name, options, the plotting code and a hash of its input data
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{name}:{sorted((options or {}).items())}:{version or _renderer_version()}".encode())
+    for section, value in (sorted(data.items()) if isinstance(data, dict) else [(None, data)]):
+        digest.update(f"{section}".encode())
+        _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+def render_figure(name, data, options, formats, stem):
+    """
+    Worker: draw one figure and write it as `<stem>.<format>` per format.
+    html is written as a <div> fragment without plotly.js, for embedding in a report page.
+    """
+    import visualization
+
+    fig = getattr(visualization, name)(data, **options)
+    for extension in formats:
+        tmp_path = f"{stem}.tmp.{extension}"
+        if extension == 'html':
+            with open(tmp_path, 'w') as handle:
+                handle.write(fig.to_html(full_html=False, include_plotlyjs=False))
+        else:
+            fig.write_image(tmp_path)
+        os.replace(tmp_path, f"{stem}.{extension}")
+    return stem
+
+
+def _write_plotlyjs(directory):
+    path = os.path.join(directory, PLOTLYJS_FILE)
+    if not os.path.exists(path):
+        from plotly.offline import get_plotlyjs
+
+        with open(path + '.tmp', 'w') as handle:
+            handle.write(get_plotlyjs())
+        os.replace(path + '.tmp', path)
+
+
+def _write_pack(directory, pack, figures, cache_dir, formats):
+    """
+    One pack's folder: index.html embedding its figures, plus a copy of each static image
+    """
+    folder = os.path.join(directory, _pack_folder(pack))
+    os.makedirs(folder, exist_ok=True)
+    sections = []
+    for name, entry in figures.items():
+        if 'error' in entry:
+            sections.append(f"<h2>{html.escape(name)}</h2>\n<p>Could not render: {html.escape(entry['error'])}</p>")
+            continue
+        stem = os.path.join(cache_dir, entry['key'])
+        entry['files'] = []
+        for extension in formats:
+            if extension == 'html':
+                with open(f"{stem}.html") as handle:
+                    sections.append(handle.read())
+                continue
+            path = os.path.join(folder, f"{name}.{extension}")
+            shutil.copyfile(f"{stem}.{extension}", path)
+            entry['files'].append(path)
+    if 'html' in formats:
+        page = REPORT_PAGE.format(
+            title=html.escape(str(pack)),
+            plotlyjs=os.path.relpath(os.path.join(directory, PLOTLYJS_FILE), folder).replace(os.sep, '/'),
+            figures='\n'.join(sections),
+        )
+        path = os.path.join(folder, 'index.html')
+        with open(path, 'w') as handle:
+            handle.write(page)
+        for entry in figures.values():
+            if 'files' in entry:
+                entry['files'].append(path)
+    return folder
+
+
+def render_packs(packs, directory, formats=('html',), figures=None, options=None, workers=None,
+                 cache_dir=DEFAULT_FIGURE_CACHE):
+    """
+    Render report packs, one folder per pack, with all their figures drawn in a process pool.
+
+    `packs` maps a pack name to (analysis_results, user_sessions or None). Each
+    figure is keyed by a hash of its input data: figures already in `cache_dir`
+    and figures shared by several packs are drawn once. html packs embed the
+    figures in one page that loads the shared plotly.js from `directory`.
+    A figure that fails is reported in the returned manifest and left out.
+    """
+    formats = tuple(formats)
+    unknown = [extension for extension in formats if extension not in REPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unsupported report format: {', '.join(unknown)}")
+    if set(formats) - {'html'} and importlib.util.find_spec('kaleido') is None:
+        raise ValueError("Static image formats need kaleido (pip install kaleido)")
+    figures = list(figures or FIGURE_INPUTS)
+    options = options or {}
+    version = _renderer_version()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    layout = {}
+    tasks = {}
+    for pack, (analysis_results, user_sessions) in packs.items():
+        layout[pack] = {}
+        for name in figures:
+            if FIGURE_INPUTS[name] == 'user_sessions' and user_sessions is None:
+                continue
+            data = figure_data(name, analysis_results, user_sessions)
+            key = figure_key(name, data, options.get(name), version)
+            layout[pack][name] = {'key': key}
+            stem = os.path.join(cache_dir, key)
+            if key not in tasks and not all(os.path.exists(f"{stem}.{extension}") for extension in formats):
+                tasks[key] = (name, data, options.get(name, {}), formats, stem)
+
+    errors = {}
+    started = time.perf_counter()
+    if tasks:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(tasks))) as pool:
+            futures = {key: pool.submit(render_figure, *task) for key, task in tasks.items()}
+            for key, future in futures.items():
+                try:
+                    future.result()
+                except Exception as error:
+                    errors[key] = f"{type(error).__name__}: {error}"
+
+    os.makedirs(directory, exist_ok=True)
+    if 'html' in formats:
+        _write_plotlyjs(directory)
+    manifest = {}
+    for pack, entries in layout.items():
+        for entry in entries.values():
+            if entry['key'] in errors:
+                entry['error'] = errors[entry['key']]
+        folder = _write_pack(directory, pack, entries, cache_dir, formats)
+        manifest[pack] = {'folder': folder, 'figures': entries}
+    return {
+        'packs': manifest,
+        'rendered': len(tasks),
+        'cached': sum(len(entries) for entries in layout.values()) - len(tasks),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def build_report(analysis_results, directory, user_sessions=None, title='report', **options):
+    """
+    One report pack of every figure for an analysis_results (see render_packs)
+    """
+    return render_packs({title: (analysis_results, user_sessions)}, directory, **options)
+
+
+def location_packs(indexes, analysis_results=None, user_sessions=None, locations=None):
+    """
+    Packs for render_packs: one per location, filtered through the indexes from
+    build_indexes, plus an 'all_locations' pack when `analysis_results` is given
+    """
+    from indexes import filtered_analysis, select_rows, take_rows
+
+    table_index = indexes['user_sessions']
+    if locations is None:
+        locations = sorted(table_index['dimensions']['Location']['labels'])
+    packs = {}
+    if analysis_results is not None:
+        packs['all_locations'] = (analysis_results, user_sessions)
+    for location in locations:
+        positions = select_rows(table_index, Location=location)
+        packs[location] = (
+            filtered_analysis(indexes, locations=location),
+            take_rows(table_index['frame'], positions, SESSION_FIGURE_COLUMNS),
+        )
+    return packs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export report packs of every figure, one per location")
+    parser.add_argument('source', help="Workbook path or directory of CSV files")
+    parser.add_argument('output', help="Directory the packs are written to")
+    parser.add_argument('--kind', help="Source kind (workbook, csv_dir)")
+    parser.add_argument('--locations', nargs='*', help="Locations to export (default: all)")
+    parser.add_argument('--formats', nargs='+', default=['html'], choices=REPORT_FORMATS)
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--cache-dir', default=DEFAULT_FIGURE_CACHE, help="Rendered figure cache")
+    args = parser.parse_args(argv)
+
+    from aggregates import add_age_group
+    from indexes import build_indexes
+    from loaders import load_datasets
+    from memo import cached_analysis
+    from pipeline import load_preprocessing
+
+    preprocessing = load_preprocessing()
+    user_details, cooking_sessions, order_details = preprocessing.clean_data(
+        *load_datasets(args.source, kind=args.kind)
+    )[:3]
+    user_sessions, session_orders = preprocessing.merge_data(user_details, cooking_sessions, order_details)
+    add_age_group(user_sessions)
+    analysis_results = cached_analysis(user_sessions, session_orders)
+    indexes = build_indexes(user_details, user_sessions, session_orders)
+    packs = location_packs(indexes, analysis_results, user_sessions, args.locations)
+
+    report = render_packs(packs, args.output, formats=args.formats, workers=args.workers, cache_dir=args.cache_dir)
+    print(f"Wrote {len(report['packs'])} packs to {args.output}: {report['rendered']} figures rendered, "
+          f"{report['cached']} reused, in {report['seconds']:,.1f}s")
+    for pack, entry in report['packs'].items():
+        for name, figure in entry['figures'].items():
+            if 'error' in figure:
+                print(f"  ! {pack} / {name}: {figure['error']}")
+
+
+if __name__ == '__main__':
+    main()
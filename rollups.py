@@ -0,0 +1,67 @@
+import pandas as pd
+
+# Calendar buckets derived from the hourly_revenue section, as pandas period frequencies
+ROLLUP_LEVELS = {
+    'hourly': 'h',
+    'daily': 'D',
+    'weekly': 'W-SUN',
+    'monthly': 'M',
+}
+
+# Additive columns of a rollup table and the hourly_revenue columns they come from
+ROLLUP_TOTALS = {
+    'orders': ('Order ID', 'count'),
+    'revenue': ('Amount (USD)', 'sum'),
+    'rating_sum': ('Rating', 'sum'),
+    'rating_count': ('Rating', 'count'),
+}
+
+
+def hourly_totals(analysis_results):
+    """
+    The hourly_revenue section as a compact time series of additive totals
+    """
+    hourly = analysis_results['hourly_revenue']
+    return pd.DataFrame(
+        {name: hourly[column].to_numpy() for name, column in ROLLUP_TOTALS.items()},
+        index=hourly.index.rename('period_start')
+    )
+
+
+def coarsen(totals, level):
+    """
+    Re-bucket a totals table at a coarser calendar level without touching order rows
+    """
+    buckets = totals.index.to_period(ROLLUP_LEVELS[level]).start_time
+    coarse = totals.groupby(buckets).sum()
+    coarse.index.name = 'period_start'
+    return coarse
+
+
+def with_means(totals):
+    """
+    Add average order value and average rating to a totals table, rounding only now
+    that every total has been added up unrounded
+    """
+    table = totals.copy()
+    table['avg_order_value'] = table['revenue'] / table['orders'].where(table['orders'] > 0)
+    table['avg_rating'] = table['rating_sum'] / table['rating_count'].where(table['rating_count'] > 0)
+    return table.round(2)
+
+
+def revenue_rollups(analysis_results, levels=tuple(ROLLUP_LEVELS)):
+    """
+    Hourly, daily, weekly and monthly revenue, order count and rating series.
+
+    Every level is derived from the hourly totals that analyze_restaurant_data
+    collects in one bucketing pass over session_orders (the hourly_revenue
+    section), each from the next finer level, so no order row is read again.
+    Daily totals feed the weekly and monthly levels, which never cross a day.
+    """
+    totals = {'hourly': hourly_totals(analysis_results)}
+    if any(level != 'hourly' for level in levels):
+        totals['daily'] = coarsen(totals['hourly'], 'daily')
+    for level in ('weekly', 'monthly'):
+        if level in levels:
+            totals[level] = coarsen(totals['daily'], level)
+    return {level: with_means(totals[level]) for level in levels}
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+# Declared storage types for the cleaned datasets
+SCHEMA = {
+    'UserDetails': {
+        'ids': ['User ID'],
+        'categories': ['Location', 'Favorite Meal'],
+        'numeric': ['Age', 'Total Orders'],
+    },
+    'CookingSessions': {
+        'ids': ['Session ID', 'User ID'],
+        'categories': ['Dish Name', 'Meal Type'],
+        'numeric': ['Duration (mins)', 'Session Rating'],
+    },
+    'OrderDetails': {
+        'ids': ['Order ID', 'User ID', 'Session ID'],
+        'categories': ['Dish Name', 'Meal Type', 'Order Status', 'Time of Day'],
+        'numeric': ['Amount (USD)', 'Rating'],
+    },
+}
+
+# Columns with more distinct values than this share of rows stay as they are
+MAX_CATEGORY_RATIO = 0.5
+
+
+def downcast_numeric(series):
+    """
+    Smallest numeric dtype that holds every value of the column exactly
+    """
+    if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        return series
+    values = series.to_numpy()
+    if pd.api.types.is_float_dtype(series.dtype):
+        finite = values[~np.isnan(values)]
+        if len(finite) == len(values) and np.array_equal(finite, np.round(finite)):
+            return pd.to_numeric(series.astype(np.int64), downcast='integer')
+        as_float32 = values.astype(np.float32)
+        if np.array_equal(as_float32.astype(values.dtype), values, equal_nan=True):
+            return series.astype(np.float32)
+        return series
+    return pd.to_numeric(series, downcast='integer')
+
+
+def build_id_maps(tables):
+    """
+    One shared dictionary per non-numeric ID column, covering every table that uses it
+    """
+    id_maps = {}
+    for name, spec in SCHEMA.items():
+        for column in spec['ids']:
+            if column not in tables[name] or pd.api.types.is_numeric_dtype(tables[name][column].dtype):
+                continue
+            id_maps.setdefault(column, []).append(tables[name][column].dropna().unique())
+    return {
+        column: pd.Index(pd.unique(np.concatenate([np.asarray(values, dtype=object) for values in parts])))
+        for column, parts in id_maps.items()
+    }
+
+
+def encode_ids(series, dictionary):
+    """
+    Replace ID strings by their integer positions in the dictionary
+    """
+    codes = dictionary.get_indexer(series)
+    wide = len(dictionary) >= np.iinfo(np.int32).max
+    missing = codes < 0
+    if missing.any():
+        # Missing IDs stay missing, so keep them in a nullable integer column
+        encoded = pd.Series(codes, index=series.index, dtype='Int64' if wide else 'Int32')
+        return encoded.mask(missing)
+    return pd.Series(codes.astype(np.int64 if wide else np.int32), index=series.index)
+
+
+def decode_ids(codes, id_maps, column):
+    """
+    Map integer ID codes back to the original IDs
+    """
+    dictionary = id_maps[column]
+    codes = pd.Series(codes)
+    decoded = dictionary.take(codes.fillna(0).astype(np.int64).to_numpy())
+    return pd.Series(decoded, index=codes.index).where(codes.notna())
+
+
+def compact_table(frame, name, id_maps):
+    """
+    Apply the declared schema to one table
+    """
+    spec = SCHEMA[name]
+    frame = frame.copy()
+    for column in spec['ids']:
+        if column not in frame:
+            continue
+        if column in id_maps:
+            frame[column] = encode_ids(frame[column], id_maps[column])
+        else:
+            frame[column] = downcast_numeric(frame[column])
+    for column in spec['categories']:
+        if column in frame and frame[column].nunique() <= MAX_CATEGORY_RATIO * max(len(frame), 1):
+            frame[column] = frame[column].astype('category')
+    for column in spec['numeric']:
+        if column in frame:
+            frame[column] = downcast_numeric(frame[column])
+    return frame
+
+
+def apply_schema(user_details, cooking_sessions, order_details):
+    """
+    Compact the three cleaned datasets.
+
+    Returns the compacted tables, the ID dictionaries (code -> original ID) and
+    a per-table report of resident memory before and after.
+    """
+    tables = {'UserDetails': user_details, 'CookingSessions': cooking_sessions, 'OrderDetails': order_details}
+    id_maps = build_id_maps(tables)
+
+    report = {}
+    compacted = {}
+    for name, frame in tables.items():
+        before = frame.memory_usage(deep=True).sum()
+        compacted[name] = compact_table(frame, name, id_maps)
+        after = compacted[name].memory_usage(deep=True).sum()
+        report[name] = {'before_bytes': int(before), 'after_bytes': int(after), 'saved_bytes': int(before - after)}
+
+    return compacted['UserDetails'], compacted['CookingSessions'], compacted['OrderDetails'], id_maps, report
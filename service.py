@@ -0,0 +1,377 @@
+import argparse
+import asyncio
+import collections
+import functools
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from graph import FIGURE_INPUTS
+
+# Query parameters a figure accepts besides the filters, and how each is parsed
+FIGURE_OPTIONS = {
+    'plot_duration_vs_rating': {'render': str, 'max_points': int},
+    'visualize_customer_insights': {'render': str, 'max_points': int},
+    'plot_revenue_trend': {'level': str},
+}
+
+# Values a text option accepts (render modes of the session scatters, rollups.ROLLUP_LEVELS)
+OPTION_CHOICES = {
+    'render': ('auto', 'scatter', 'density', 'webgl'),
+    'level': ('hourly', 'daily', 'weekly', 'monthly'),
+}
+
+# Smallest value a numeric option accepts
+OPTION_MINIMUMS = {'max_points': 1}
+
+# Query parameters selecting a filtered analysis (see indexes.filtered_analysis)
+FILTER_PARAMETERS = ('start', 'end', 'locations', 'dishes', 'meal_types', 'statuses')
+LIST_PARAMETERS = ('locations', 'dishes', 'meal_types', 'statuses')
+
+# Rendered responses kept in memory, least recently used first out
+RESPONSE_CACHE_SIZE = 128
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+# Warm state of the running service, inherited by forked worker processes
+_state = None
+
+
+class NotFound(LookupError):
+    pass
+
+
+class InvalidRequest(ValueError):
+    pass
+
+
+def parse_filters(query):
+    """
+    Filter arguments from query parameters; list filters take repeated or comma-separated values
+    """
+    filters = {}
+    for name in FILTER_PARAMETERS:
+        if name not in query:
+            continue
+        values = [part.strip() for value in query[name] for part in value.split(',') if part.strip()]
+        if not values:
+            raise InvalidRequest(f"{name} needs a value")
+        filters[name] = tuple(values) if name in LIST_PARAMETERS else values[-1]
+    return filters
+
+
+def parse_options(name, query):
+    """
+    Figure keyword arguments from query parameters
+    """
+    options = {}
+    for option, parse in FIGURE_OPTIONS.get(name, {}).items():
+        if option in query:
+            try:
+                options[option] = parse(query[option][-1])
+            except ValueError:
+                raise InvalidRequest(f"Invalid value for {option}: {query[option][-1]}")
+            if option in OPTION_CHOICES and options[option] not in OPTION_CHOICES[option]:
+                raise InvalidRequest(f"{option} must be one of {', '.join(OPTION_CHOICES[option])}")
+            if option in OPTION_MINIMUMS and options[option] < OPTION_MINIMUMS[option]:
+                raise InvalidRequest(f"{option} must be at least {OPTION_MINIMUMS[option]}")
+    return options
+
+
+def to_json(value):
+    """
+    JSON text of an analysis section (DataFrame or dict of metrics) or insights list
+    """
+    if hasattr(value, 'to_json'):
+        return value.to_json(orient='split', date_format='iso')
+    return json.dumps(value, default=str)
+
+
+def _ready():
+    return os.getpid()
+
+
+def _analysis(filters):
+    """
+    Worker: analysis_results for a set of filters (as sorted items); the warm results when there are none.
+    Filtered analyses go through memo.cached_analysis, so each worker keeps its recent ones.
+    """
+    if not filters:
+        return _state['analysis_results']
+    from indexes import filtered_analysis
+
+    return filtered_analysis(_state['indexes'], **dict(filters))
+
+
+def _session_rows(filters):
+    """
+    Worker: user_sessions restricted to the filters, for figures drawn from session rows
+    """
+    if not filters:
+        return _state['user_sessions']
+    from indexes import FILTER_ARGUMENTS, select_rows, take_rows
+
+    filters = dict(filters)
+    dimensions = {FILTER_ARGUMENTS[name]: value for name, value in filters.items() if name in FILTER_ARGUMENTS}
+    positions = select_rows(
+        _state['indexes']['user_sessions'], start=filters.get('start'), end=filters.get('end'), **dimensions
+    )
+    return take_rows(_state['user_sessions'], positions, ['Duration (mins)', 'Session Rating', 'Age_Group'])
+
+
+def render_insights(filters):
+    """
+    Worker: insights JSON; none when the filters match no orders
+    """
+    from analysis import generate_business_insights
+
+    results = _analysis(filters)
+    if results['meal_analysis'].empty:
+        return json.dumps([])
+    return json.dumps(generate_business_insights(results), default=str)
+
+
+def render_section(name, filters):
+    """
+    Worker: JSON of one analysis section
+    """
+    return to_json(_analysis(filters)[name])
+
+
+def render_figure(name, filters, options):
+    """
+    Worker: plotly JSON of one figure
+    """
+    import visualization
+
+    source = FIGURE_INPUTS[name]
+    if source == 'user_sessions':
+        data = _session_rows(filters)
+    else:
+        results = _analysis(filters)
+        data = results if source == 'analysis_results' else results[source]
+    return getattr(visualization, name)(data, **options).to_json()
+
+
+class AnalyticsService:
+    """
+    Datasets loaded, cleaned, merged, analysed and indexed once, answering
+    insight, section and figure requests from that warm state.
+
+    Filtered analyses and rendering are CPU-bound pandas/plotly work, so they run
+    in worker processes forked from the loaded state (threads where the platform
+    cannot fork), and concurrent users do not queue behind one GIL. Concurrent
+    requests for the same response share a single computation, and finished
+    responses are kept in an LRU of RESPONSE_CACHE_SIZE entries. The state is
+    module-wide, so a process runs one service.
+    """
+
+    def __init__(self, source, kind=None, workers=None, processes=True):
+        self.source = source
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.pool = None
+        self._responses = collections.OrderedDict()
+        self._pending = {}
+
+    def load(self):
+        """
+        Load, clean, merge, analyse and index the datasets, then start the workers
+        """
+        global _state
+
+        from aggregates import add_age_group
+        from indexes import build_indexes
+        from loaders import load_datasets
+        from memo import cached_analysis
+        from pipeline import load_preprocessing
+
+        preprocessing = load_preprocessing()
+        user_details, cooking_sessions, order_details = preprocessing.clean_data(
+            *load_datasets(self.source, kind=self.kind)
+        )[:3]
+        self.user_sessions, self.session_orders = preprocessing.merge_data(
+            user_details, cooking_sessions, order_details
+        )
+        add_age_group(self.user_sessions)
+        self.analysis_results = cached_analysis(self.user_sessions, self.session_orders)
+        self.indexes = build_indexes(user_details, self.user_sessions, self.session_orders)
+        self.labels = {}
+        for table_index in self.indexes.values():
+            for dimension, index in table_index['dimensions'].items():
+                self.labels.setdefault(dimension, set()).update(index['labels'])
+        _state = {
+            'user_sessions': self.user_sessions,
+            'analysis_results': self.analysis_results,
+            'indexes': self.indexes,
+        }
+
+        if self.processes and 'fork' in multiprocessing.get_all_start_methods():
+            # Imported before forking, so workers inherit the plotting modules instead of importing them each
+            import visualization
+
+            context = multiprocessing.get_context('fork')
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            # The first task forks every worker, before the event loop starts any threads
+            self.pool.submit(_ready).result()
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        return self
+
+    async def coalesce(self, key, compute):
+        """
+        Response for a key: cached, joined while already running, or started now
+        """
+        if key in self._responses:
+            self._responses.move_to_end(key)
+            return self._responses[key]
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+        task = asyncio.ensure_future(compute())
+        self._pending[key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            self._pending.pop(key, None)
+        self._responses[key] = result
+        while len(self._responses) > RESPONSE_CACHE_SIZE:
+            self._responses.popitem(last=False)
+        return result
+
+    def run(self, function, *args):
+        """
+        Run a module-level function on the worker pool
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.pool, functools.partial(function, *args))
+
+    def validate(self, filters):
+        """
+        Filters as sorted items, after checking their dates parse and their labels exist
+        """
+        import pandas as pd
+        from indexes import FILTER_ARGUMENTS
+
+        for name in ('start', 'end'):
+            if name in filters:
+                try:
+                    valid = not pd.isna(pd.Timestamp(filters[name]))
+                except ValueError:
+                    valid = False
+                if not valid:
+                    raise InvalidRequest(f"Invalid date for {name}: {filters[name]}")
+        for name, values in filters.items():
+            if name in FILTER_ARGUMENTS:
+                labels = self.labels.get(FILTER_ARGUMENTS[name], set())
+                unknown = [value for value in values if value not in labels]
+                if unknown:
+                    raise InvalidRequest(f"Unknown {name}: {', '.join(unknown)}")
+        return tuple(sorted(filters.items()))
+
+    async def insights(self, filters):
+        filters = self.validate(filters)
+        return await self.coalesce(('insights', filters), lambda: self.run(render_insights, filters))
+
+    async def section(self, name, filters):
+        if name not in self.analysis_results:
+            raise NotFound(f"Unknown analysis section: {name}")
+        filters = self.validate(filters)
+        return await self.coalesce(('section', name, filters), lambda: self.run(render_section, name, filters))
+
+    async def figure(self, name, filters, options):
+        if name not in FIGURE_INPUTS:
+            raise NotFound(f"Unknown figure: {name}")
+        filters = self.validate(filters)
+        key = ('figure', name, filters, tuple(sorted(options.items())))
+        return await self.coalesce(key, lambda: self.run(render_figure, name, filters, options))
+
+    async def warm(self):
+        """
+        Render the insights and every figure of the unfiltered data ahead of the first request
+        """
+        await asyncio.gather(self.insights({}), *(self.figure(name, {}, {}) for name in FIGURE_INPUTS))
+
+    async def respond(self, method, target):
+        """
+        (status, JSON body) for one request
+        """
+        if method != 'GET':
+            return 405, json.dumps({'error': f"Method {method} not allowed"})
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            filters = parse_filters(query)
+            if parts == ['health']:
+                rows = {'user_sessions': len(self.user_sessions), 'session_orders': len(self.session_orders)}
+                return 200, json.dumps({'status': 'ok', 'rows': rows, 'pending': len(self._pending)})
+            if parts == ['insights']:
+                return 200, await self.insights(filters)
+            if parts == ['sections']:
+                return 200, json.dumps(list(self.analysis_results))
+            if len(parts) == 2 and parts[0] == 'sections':
+                return 200, await self.section(parts[1], filters)
+            if parts == ['figures']:
+                return 200, json.dumps(list(FIGURE_INPUTS))
+            if len(parts) == 2 and parts[0] == 'figures':
+                return 200, await self.figure(parts[1], filters, parse_options(parts[1], query))
+            raise NotFound(f"No endpoint at {url.path}")
+        except NotFound as error:
+            return 404, json.dumps({'error': str(error)})
+        except InvalidRequest as error:
+            return 400, json.dumps({'error': str(error)})
+        except Exception as error:
+            return 500, json.dumps({'error': f"{type(error).__name__}: {error}"})
+
+    async def handle(self, reader, writer):
+        """
+        Serve one HTTP/1.1 request per connection
+        """
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()).strip():
+                pass
+            if len(request_line) < 2:
+                status, body = 400, json.dumps({'error': 'Malformed request'})
+            else:
+                status, body = await self.respond(request_line[0], request_line[1])
+            payload = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8050, warm=False):
+        if warm:
+            await self.warm()
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve insights and figures from warm analysis state")
+    parser.add_argument('source', help="Workbook path or directory of CSV files")
+    parser.add_argument('--kind', help="Source kind (workbook, csv_dir)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--workers', type=int, help="Processes rendering figures and filtered analyses")
+    parser.add_argument('--threads', action='store_true', help="Render on threads instead of worker processes")
+    parser.add_argument('--warm', action='store_true', help="Render the insights and every figure before serving")
+    args = parser.parse_args(argv)
+
+    service = AnalyticsService(args.source, kind=args.kind, workers=args.workers, processes=not args.threads).load()
+    print(f"Serving on http://{args.host}:{args.port}")
+    asyncio.run(service.serve(args.host, args.port, warm=args.warm))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# Opt-in approximate mode: distinct counts to within `relative_error` (one standard
+# error of HyperLogLog), quantiles from t-digests with `compression` centroids
+APPROXIMATE_DEFAULTS = {'relative_error': 0.01, 'compression': 200}
+
+
+def hll_precision(relative_error):
+    """
+    Number of HyperLogLog index bits needed for a target relative standard error
+    """
+    return min(18, max(4, math.ceil(2 * math.log2(1.04 / relative_error))))
+
+
+def hash_values(values):
+    """
+    Stable 64-bit hashes of a column's values, identical across chunks and processes
+    """
+    return pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy()
+
+
+class HyperLogLog:
+    """
+    Mergeable distinct-count sketch
+    """
+
+    def __init__(self, precision=14, registers=None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    @staticmethod
+    def positions(hashes, precision):
+        """
+        Register index and rank (position of the first set bit) for each hash
+        """
+        remaining_bits = 64 - precision
+        index = (hashes >> np.uint64(remaining_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << remaining_bits) - 1)
+        # frexp gives the bit length of the remaining bits; 0 maps to the maximum rank
+        rank = remaining_bits - np.frexp(rest.astype(float))[1] + 1
+        return index, rank.astype(np.uint8)
+
+    def update_hashes(self, hashes):
+        index, rank = self.positions(hashes, self.precision)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        return HyperLogLog(self.precision, np.maximum(self.registers, other.registers))
+
+    def estimate(self):
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        empty = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * size and empty:
+            estimate = size * math.log(size / empty)
+        return estimate
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch holding at most about `compression` weighted centroids
+    """
+
+    def __init__(self, compression=200, means=None, weights=None):
+        self.compression = compression
+        self.means = means if means is not None else np.empty(0)
+        self.weights = weights if weights is not None else np.empty(0)
+
+    def _compress(self, means, weights):
+        """
+        Merge sorted centroids so that each spans at most one unit of the k1 scale function
+        """
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        if total == 0:
+            return TDigest(self.compression)
+        middle = (np.cumsum(weights) - weights / 2) / total
+        scale = self.compression / (2 * math.pi) * np.arcsin(2 * middle - 1)
+        cluster = np.floor(scale - scale[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+        return TDigest(self.compression, merged_means, merged_weights)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        return self._compress(np.r_[self.means, values], np.r_[self.weights, np.ones(len(values))])
+
+    def merge(self, other):
+        return self._compress(np.r_[self.means, other.means], np.r_[self.weights, other.weights])
+
+    def count(self):
+        return self.weights.sum()
+
+    def quantile(self, q):
+        if not len(self.means):
+            return np.nan
+        if len(self.means) == 1:
+            return self.means[0]
+        centres = (np.cumsum(self.weights) - self.weights / 2) / self.weights.sum()
+        return float(np.interp(q, centres, self.means))
+
+
+def group_sketches(codes, labels, values, stat, options):
+    """
+    One sketch per group: t-digests for medians, HyperLogLogs for distinct counts
+    """
+    present = (codes >= 0) & pd.notna(values)
+    codes = codes[present]
+    if stat == 'nunique':
+        precision = hll_precision(options['relative_error'])
+        index, rank = HyperLogLog.positions(hash_values(values[present]), precision)
+        registers = np.zeros((len(labels), 1 << precision), dtype=np.uint8)
+        np.maximum.at(registers, (codes, index), rank)
+        return {label: HyperLogLog(precision, registers[code]) for code, label in enumerate(labels)}
+
+    values = np.asarray(values[present], dtype=float)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    return {
+        label: TDigest(options['compression']).update(values[order[bounds[code]:bounds[code + 1]]])
+        for code, label in enumerate(labels)
+    }
+
+
+def merge_sketches(left, right):
+    """
+    Merge two {group: sketch} maps
+    """
+    merged = dict(left)
+    for label, sketch in right.items():
+        merged[label] = merged[label].merge(sketch) if label in merged else sketch
+    return merged
+
+
+def sketch_result(sketches, stat, index):
+    """
+    Median or distinct-count estimates from {group: sketch}, aligned to a group index
+    """
+    if stat == 'nunique':
+        estimates = {label: int(round(sketch.estimate())) for label, sketch in sketches.items()}
+        return pd.Series(estimates, dtype='int64').reindex(index, fill_value=0)
+    estimates = {label: sketch.quantile(0.5) for label, sketch in sketches.items()}
+    return pd.Series(estimates, dtype=float).reindex(index)
+
+
+class SpaceSaving:
+    """
+    Mergeable weighted heavy-hitter sketch keeping at most `capacity` counters.
+
+    Each counter holds an upper bound on its label's total weight and the most
+    that bound may overstate it; any label without a counter totals at most
+    `floor`. Weights must be non-negative.
+    """
+
+    def __init__(self, capacity=1000, counters=None, floor=0.0):
+        self.capacity = capacity
+        self.counters = counters if counters is not None else pd.DataFrame(
+            {'count': pd.Series(dtype=float), 'error': pd.Series(dtype=float)}
+        )
+        self.floor = floor
+
+    @classmethod
+    def from_totals(cls, totals, capacity=1000):
+        """
+        Sketch of exact per-label totals, keeping the `capacity` largest
+        """
+        counters = pd.DataFrame({'count': totals.astype(float), 'error': 0.0})
+        return cls(capacity)._truncate(counters, 0.0)
+
+    def _truncate(self, counters, floor):
+        if len(counters) > self.capacity:
+            counters = counters.nlargest(self.capacity + 1, 'count', keep='first')
+            floor = max(floor, counters['count'].iloc[-1])
+            counters = counters.iloc[:-1]
+        return SpaceSaving(self.capacity, counters, floor)
+
+    def update(self, labels, weights=None):
+        """
+        Fold a batch of (label, weight) pairs in; weights default to 1 per row
+        """
+        codes, uniques = pd.factorize(pd.Series(labels))
+        present = codes >= 0
+        weights = np.ones(len(codes)) if weights is None else np.nan_to_num(np.asarray(weights, dtype=float))
+        totals = np.bincount(codes[present], weights=weights[present], minlength=len(uniques))
+        return self.merge(SpaceSaving.from_totals(pd.Series(totals, index=pd.Index(uniques)), self.capacity))
+
+    def merge(self, other):
+        """
+        Union of two sketches: bounds add up, a label missing from one side counts
+        that side's floor towards its upper bound, and the largest counters are kept
+        """
+        left, right = self.counters, other.counters
+        labels = left.index.union(right.index, sort=False)
+        left, right = left.reindex(labels), right.reindex(labels)
+        upper = left['count'].fillna(self.floor) + right['count'].fillna(other.floor)
+        lower = (left['count'] - left['error']).fillna(0.0) + (right['count'] - right['error']).fillna(0.0)
+        counters = pd.DataFrame({'count': upper, 'error': upper - lower})
+        return SpaceSaving(max(self.capacity, other.capacity))._truncate(counters, self.floor + other.floor)
+
+
+class CountMin:
+    """
+    Mergeable weighted frequency sketch: `depth` rows of `width` hashed counters.
+
+    Estimates never undercount and, with probability 1 - exp(-depth), overcount
+    by at most e / width of the total weight.
+    """
+
+    # Odd 64-bit multipliers, one per row, shared by every sketch so tables merge
+    MULTIPLIERS = np.array([
+        0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+        0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53, 0x94D049BB133111EB, 0xBF58476D1CE4E5B9,
+    ], dtype=np.uint64)
+
+    def __init__(self, width=2048, depth=4, table=None):
+        if width & (width - 1) or not 1 <= depth <= len(self.MULTIPLIERS):
+            raise ValueError("CountMin width must be a power of two and depth at most 8")
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width))
+
+    def _columns(self, hashes):
+        shift = np.uint64(64 - (self.width.bit_length() - 1))
+        return [((hashes * multiplier) >> shift).astype(np.intp) for multiplier in self.MULTIPLIERS[:self.depth]]
+
+    def update_hashes(self, hashes, weights=None):
+        weights = np.ones(len(hashes)) if weights is None else np.nan_to_num(np.asarray(weights, dtype=float))
+        table = self.table.copy()
+        for row, columns in enumerate(self._columns(hashes)):
+            table[row] += np.bincount(columns, weights=weights, minlength=self.width)
+        return CountMin(self.width, self.depth, table)
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge CountMin sketches of different shapes")
+        return CountMin(self.width, self.depth, self.table + other.table)
+
+    def estimate_hashes(self, hashes):
+        return np.min([self.table[row][columns] for row, columns in enumerate(self._columns(hashes))], axis=0)
+
+    def total(self):
+        return self.table[0].sum()
+
+    def error_bound(self):
+        return math.e / self.width * self.total()
@@ -0,0 +1,342 @@
+import contextlib
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from aggregates import (
+    AGE_BINS,
+    AGE_LABELS,
+    DURATION_BIN_WIDTH,
+    ORDER_SECTIONS,
+    RATING_BIN_EDGES,
+    SECTION_ORDER,
+    SESSION_SECTIONS,
+    SUM_STATS,
+    VALUE_STATS,
+    _stat_list,
+    finalize_analysis,
+    section_columns,
+)
+from graph import required_sections
+from indexes import DATE_COLUMNS, FILTER_ARGUMENTS, FILTER_COLUMNS
+from profiling import stage
+
+# Stored tables, in DATASET_FILES order
+STORE_TABLES = ('user_details', 'cooking_sessions', 'order_details')
+
+# Indexes created once the tables are loaded: join keys, dates and grouping columns
+STORE_INDEXES = {
+    'user_details': ('User ID', 'Location', 'Age'),
+    'cooking_sessions': ('Session ID', 'User ID', 'Session Start', 'Meal Type', 'Dish Name'),
+    'order_details': ('Session ID', 'User ID', 'Order Date', 'Order Status', 'Meal Type', 'Time of Day', 'Dish Name'),
+}
+
+# merge_data as views: (view, base table, lookup table, join key); both are left joins
+STORE_VIEWS = (
+    ('user_sessions', 'cooking_sessions', 'user_details', 'User ID'),
+    ('session_orders', 'order_details', 'cooking_sessions', 'Session ID'),
+)
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _columns(connection, table):
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({_quote(table)})")]
+
+
+@contextlib.contextmanager
+def connect(path):
+    """
+    Connection to a store, committed and closed when the block exits
+    """
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def write_table(connection, table, frame, append=False):
+    """
+    Store a cleaned frame as a table, datetimes as sortable 'YYYY-MM-DD HH:MM:SS' text
+    """
+    frame.to_sql(table, connection, if_exists='append' if append else 'replace', index=False, chunksize=50_000)
+
+
+def create_indexes(connection):
+    for table, columns in STORE_INDEXES.items():
+        present = set(_columns(connection, table))
+        for column in columns:
+            if column in present:
+                name = f"idx_{table}_{column}".replace(' ', '_').replace('(', '').replace(')', '')
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {_quote(name)} ON {_quote(table)} ({_quote(column)})")
+
+
+def view_columns(connection):
+    """
+    Every merge_data view column and where it comes from, as {view: {name: (alias, column)}}
+    with alias 'b' for the base table and 'l' for the lookup, named as pd.merge names
+    them (including the _x/_y suffixes for names present on both sides)
+    """
+    views = {}
+    for view, base, lookup, on in STORE_VIEWS:
+        base_columns, lookup_columns = _columns(connection, base), _columns(connection, lookup)
+        shared = set(base_columns) & set(lookup_columns) - {on}
+        columns = {column + '_x' if column in shared else column: ('b', column) for column in base_columns}
+        for column in lookup_columns:
+            if column != on:
+                columns[column + '_y' if column in shared else column] = ('l', column)
+        views[view] = columns
+    return views
+
+
+def view_source(view, columns, names):
+    """
+    FROM clause reading some columns of a merge_data view. The lookup table is
+    joined only when one of the columns comes from it, and only the named columns
+    are projected.
+    """
+    _, base, lookup, on = next(entry for entry in STORE_VIEWS if entry[0] == view)
+    names = [name for name in dict.fromkeys(names) if name in columns]
+    select = ', '.join(f"{columns[name][0]}.{_quote(columns[name][1])} AS {_quote(name)}" for name in names)
+    join = ''
+    if any(columns[name][0] == 'l' for name in names):
+        join = f" LEFT JOIN {_quote(lookup)} l ON b.{_quote(on)} = l.{_quote(on)}"
+    return f"(SELECT {select or '1'} FROM {_quote(base)} b{join})"
+
+
+def create_views(connection):
+    """
+    user_sessions and session_orders views over the stored tables, for ad-hoc SQL
+    """
+    for view, columns in view_columns(connection).items():
+        connection.execute(f"DROP VIEW IF EXISTS {_quote(view)}")
+        connection.execute(f"CREATE VIEW {_quote(view)} AS SELECT * FROM {view_source(view, columns, columns)}")
+
+
+def build_store(path, user_details, cooking_sessions, order_details):
+    """
+    Write the cleaned datasets to an indexed SQLite database with the merge_data views
+    """
+    with stage('build_store', inputs=(user_details, cooking_sessions, order_details)):
+        with connect(path) as connection:
+            for table, frame in zip(STORE_TABLES, (user_details, cooking_sessions, order_details)):
+                write_table(connection, table, frame)
+            create_indexes(connection)
+            create_views(connection)
+    return path
+
+
+def store_pipeline(source, path, chunksize=100_000, kind=None):
+    """
+    Clean a workbook or CSV directory into a store, reading orders chunk by chunk
+    so the order history never has to fit in memory
+    """
+    from loaders import iter_order_chunks, load_lookup_tables
+    from pipeline import load_preprocessing
+
+    preprocessing = load_preprocessing()
+    user_details, cooking_sessions = load_lookup_tables(source, kind=kind)
+    with connect(path) as connection:
+        write_table(connection, 'user_details', preprocessing.clean_user_details(user_details))
+        write_table(connection, 'cooking_sessions', preprocessing.clean_cooking_sessions(cooking_sessions))
+        connection.execute("DROP TABLE IF EXISTS order_details")
+        for order_chunk in iter_order_chunks(source, chunksize, kind=kind):
+            write_table(connection, 'order_details', preprocessing.clean_order_details(order_chunk.copy()), append=True)
+        create_indexes(connection)
+        create_views(connection)
+    return path
+
+
+def _age_group_sql():
+    cases = ' '.join(
+        f"WHEN {_quote('Age')} > {low} AND {_quote('Age')} <= {high} THEN '{label}'"
+        for low, high, label in zip(AGE_BINS[:-1], AGE_BINS[1:], AGE_LABELS)
+    )
+    return f"CASE {cases} END"
+
+
+def _rating_bin_sql():
+    # RATING_BIN_EDGES are evenly spaced, so the bin is the truncated quotient, clipped
+    step = RATING_BIN_EDGES[1] - RATING_BIN_EDGES[0]
+    last = len(RATING_BIN_EDGES) - 2
+    rating = _quote('Session Rating')
+    return f"MIN(MAX(CAST(({rating} - {RATING_BIN_EDGES[0]}) / {step} AS INTEGER), 0), {last}) * {step} + {RATING_BIN_EDGES[0]}"
+
+
+def _duration_bin_sql():
+    duration = _quote('Duration (mins)')
+    return f"CAST(MAX({duration}, 0) / {float(DURATION_BIN_WIDTH)} AS INTEGER) * {float(DURATION_BIN_WIDTH)}"
+
+
+# Derived keys (see aggregates.DERIVED_KEYS) as SQL expressions, one per index level
+SQL_KEYS = {
+    'Age_Group': (('Age_Group', _age_group_sql()),),
+    'Rating_Bin': (('Rating_Bin', _rating_bin_sql()),),
+    'Duration_Rating_Bin': (('Duration_Bin', _duration_bin_sql()), ('Rating_Bin', _rating_bin_sql())),
+    'Order_Hour': (('Order_Hour', f"strftime('%Y-%m-%d %H:00:00', {_quote('Order Date')})"),),
+}
+
+
+def key_levels(key):
+    """
+    (index level name, SQL expression) of every level of a group key
+    """
+    if key in SQL_KEYS:
+        return SQL_KEYS[key]
+    return ((key, _quote(key)),)
+
+
+def _key_index(rows, key):
+    """
+    Group labels fetched from SQL as the index factorize_key would build
+    """
+    if key is None:
+        return pd.Index([0])
+    levels = key_levels(key)
+    arrays = [rows[f"k{level}"] for level in range(len(levels))]
+    if key == 'Age_Group':
+        return pd.CategoricalIndex(arrays[0], categories=AGE_LABELS, ordered=True, name=key)
+    if key == 'Order_Hour':
+        return pd.DatetimeIndex(pd.to_datetime(arrays[0]), name=key).as_unit('us')
+    if len(levels) > 1:
+        return pd.MultiIndex.from_arrays([np.asarray(array) for array in arrays], names=[name for name, _ in levels])
+    return pd.Index(arrays[0], name=key)
+
+
+def _where(conditions, extra=()):
+    conditions = list(conditions) + list(extra)
+    return f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+
+def section_partial(connection, source, key, spec, conditions, params):
+    """
+    Partial aggregate of one section (as aggregates.aggregate_sections builds it),
+    with every count, sum and value count computed by a GROUP BY inside SQLite
+    """
+    levels = [] if key is None else key_levels(key)
+    keys = [f"{expression} AS k{level}" for level, (_, expression) in enumerate(levels)]
+    present = [f"k{level} IS NOT NULL" for level in range(len(levels))]
+    group = f" GROUP BY {', '.join(f'k{level}' for level in range(len(levels)))}" if levels else ''
+
+    aggregates = []
+    names = []
+    for column, column_stats in spec.items():
+        column_stats = _stat_list(column_stats)
+        aggregates.append(f"COUNT({_quote(column)})")
+        names.append((column, 'count'))
+        if any(stat in SUM_STATS for stat in column_stats):
+            aggregates.append(f"COALESCE(SUM({_quote(column)}), 0)")
+            names.append((column, 'sum'))
+            if any(stat in ('std', 'var') for stat in column_stats):
+                aggregates.append(f"COALESCE(SUM({_quote(column)} * {_quote(column)}), 0)")
+                names.append((column, 'sumsq'))
+
+    source = f"(SELECT *{''.join(', ' + key for key in keys)} FROM {source}{_where(conditions)})"
+    sql = f"SELECT {', '.join([f'k{level}' for level in range(len(levels))] + aggregates)} FROM {source}"
+    rows = pd.read_sql_query(f"{sql}{_where(present)}{group}", connection, params=params)
+    if levels:
+        rows = rows.sort_values([f"k{level}" for level in range(len(levels))], kind='stable')
+    labels = _key_index(rows, key)
+    stats = pd.DataFrame(
+        {name: rows.iloc[:, len(levels) + position].to_numpy() for position, name in enumerate(names)},
+        index=labels
+    )
+    if key == 'Age_Group':
+        # Empty age groups keep a zero row, as age_group_key gives them
+        stats = stats.reindex(pd.CategoricalIndex(AGE_LABELS, categories=AGE_LABELS, ordered=True, name=key),
+                              fill_value=0)
+
+    values = {}
+    for column, column_stats in spec.items():
+        if not any(stat in VALUE_STATS for stat in _stat_list(column_stats)):
+            continue
+        # Distinct (group, value) pairs and their counts: the value counts medians and nunique use
+        group_by = ', '.join([f'k{level}' for level in range(len(levels))] + [_quote(column)])
+        pairs = pd.read_sql_query(
+            f"SELECT {', '.join([f'k{level}' for level in range(len(levels))] + [_quote(column), 'COUNT(*)'])} "
+            f"FROM {source}{_where(present, [f'{_quote(column)} IS NOT NULL'])} GROUP BY {group_by}",
+            connection, params=params
+        )
+        group_labels = _key_index(pairs, key) if levels else pd.Index(np.zeros(len(pairs), dtype=np.intp))
+        index = pd.MultiIndex.from_arrays([group_labels, pairs[column]])
+        values[column] = pd.Series(pairs.iloc[:, -1].to_numpy(dtype=np.int64), index=index)
+    return {'stats': stats, 'values': values, 'sketches': {}}
+
+
+def filter_conditions(view, start=None, end=None, **filters):
+    """
+    WHERE conditions, their parameters and the view columns they read, restricting
+    a view as indexes.select_rows does for the in-memory tables
+    """
+    conditions, params, names = [], [], []
+    date_column = _quote(DATE_COLUMNS[view])
+    if start is not None:
+        conditions.append(f"{date_column} >= ?")
+        params.append(pd.Timestamp(start).strftime(DATE_FORMAT))
+    if end is not None:
+        conditions.append(f"{date_column} < ?")
+        params.append(pd.Timestamp(end).strftime(DATE_FORMAT))
+    if start is not None or end is not None:
+        names.append(DATE_COLUMNS[view])
+    for dimension, wanted in filters.items():
+        if wanted is None or dimension not in FILTER_COLUMNS[view]:
+            continue
+        wanted = [wanted] if np.ndim(wanted) == 0 else list(wanted)
+        placeholders = ', '.join('?' * len(wanted))
+        if dimension == 'Location' and view == 'session_orders':
+            # Orders take their user's Location, through the user index
+            conditions.append(
+                f"{_quote('User ID_x')} IN (SELECT {_quote('User ID')} FROM user_details "
+                f"WHERE {_quote('Location')} IN ({placeholders}))"
+            )
+            names.append('User ID_x')
+        else:
+            conditions.append(f"{_quote(FILTER_COLUMNS[view][dimension])} IN ({placeholders})")
+            names.append(FILTER_COLUMNS[view][dimension])
+        params.extend(wanted)
+    return conditions, params, names
+
+
+def store_sections(connection):
+    """
+    Sections of the full analysis over a store, as aggregates.default_sections picks
+    them: hourly_revenue only when Order Date was written as datetimes
+    """
+    declared = {row[1]: row[2] for row in connection.execute("PRAGMA table_info(order_details)")}
+    dated = declared.get('Order Date') == 'TIMESTAMP'
+    return tuple(section for section in SECTION_ORDER if dated or section != 'hourly_revenue')
+
+
+def sql_analysis(path, outputs=None, start=None, end=None, locations=None, dishes=None,
+                 meal_types=None, statuses=None):
+    """
+    analysis_results computed inside a store from build_store or store_pipeline.
+
+    Each section is one GROUP BY over the merge_data join (plus one per median
+    or distinct count), so only group totals reach Python; sections reading only
+    base table columns skip the join. Filters work as in
+    indexes.filtered_analysis and run against the store's indexes.
+    """
+    arguments = {'locations': locations, 'dishes': dishes, 'meal_types': meal_types, 'statuses': statuses}
+    filters = {FILTER_ARGUMENTS[name]: wanted for name, wanted in arguments.items() if wanted is not None}
+    partials = {}
+    with connect(path) as connection:
+        sections = required_sections(store_sections(connection) if outputs is None else outputs)
+        columns = view_columns(connection)
+        for view, specs in (('session_orders', ORDER_SECTIONS), ('user_sessions', SESSION_SECTIONS)):
+            conditions, params, filter_names = filter_conditions(view, start=start, end=end, **filters)
+            for section in sections:
+                if section not in specs:
+                    continue
+                key, spec = specs[section]
+                source = view_source(view, columns[view], section_columns({section: (key, spec)}) + filter_names)
+                with stage(f"sql.{section}"):
+                    partials[section] = section_partial(connection, source, key, spec, conditions, params)
+    return finalize_analysis(partials)
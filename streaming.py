@@ -0,0 +1,81 @@
+from aggregates import (
+    ORDER_SECTIONS,
+    SECTION_ORDER,
+    SESSION_SECTIONS,
+    aggregate_sections,
+    finalize_analysis,
+    merge_partials,
+)
+from graph import required_sections
+from joins import index_table, lazy_join
+from loaders import iter_order_chunks, load_lookup_tables
+from pipeline import load_preprocessing
+from topk import heavy_hitters, merge_heavy_hitters
+
+
+def _table_sections(specs, outputs):
+    """
+    The sections of one table that some outputs (None for all) need
+    """
+    sections = required_sections(SECTION_ORDER if outputs is None else outputs)
+    return {section: specs[section] for section in sections if section in specs}
+
+
+def fold_order_chunk(partials, order_chunk, sessions_index, approximate=False, topk=False, outputs=None):
+    """
+    Clean one chunk of orders, join it to the indexed sessions and fold it into the partials.
+    With `topk`, the chunk's heavy-hitter sketches are merged into partials['heavy_hitters'].
+    """
+    preprocessing = load_preprocessing()
+    order_chunk = preprocessing.clean_order_details(order_chunk.copy())
+    session_orders = lazy_join(order_chunk, sessions_index)
+
+    order_sections = _table_sections(ORDER_SECTIONS, outputs)
+    for section, chunk_partial in aggregate_sections(session_orders, order_sections, approximate=approximate).items():
+        partials[section] = chunk_partial if section not in partials else merge_partials(partials[section], chunk_partial)
+    if topk:
+        chunk_hitters = heavy_hitters(session_orders, 'session_orders', topk)
+        partials['heavy_hitters'] = merge_heavy_hitters(partials.get('heavy_hitters', {}), chunk_hitters)
+    return partials
+
+
+def stream_analysis(user_details, cooking_sessions, order_chunks, approximate=False, topk=False, outputs=None):
+    """
+    Streaming equivalent of clean_data -> merge_data -> analyze_restaurant_data.
+
+    Users and sessions stay in memory as the join lookup; orders are consumed
+    chunk by chunk, so peak memory follows the chunk size rather than the order history.
+    With `approximate`, medians are kept as t-digests, so the order state stays
+    constant-size even for columns with many distinct values.
+    With `topk` (True or a dict of sketch sizes, see topk.py), the results also
+    hold the merged 'heavy_hitters' sketches for top-K dish and location rankings.
+    `outputs` (section or consumer names, see graph.py) limits the sections, e.g.
+    to leave out the full per-dish dish_analysis when the top-K sketches suffice.
+    """
+    preprocessing = load_preprocessing()
+    user_details = preprocessing.clean_user_details(user_details)
+    cooking_sessions = preprocessing.clean_cooking_sessions(cooking_sessions)
+    user_sessions = preprocessing.merge_user_sessions(user_details, cooking_sessions)
+
+    partials = aggregate_sections(user_sessions, _table_sections(SESSION_SECTIONS, outputs), approximate=approximate)
+    if topk:
+        partials['heavy_hitters'] = heavy_hitters(user_sessions, 'user_sessions', topk)
+    sessions_index = index_table(cooking_sessions, 'Session ID')
+    for order_chunk in order_chunks:
+        fold_order_chunk(partials, order_chunk, sessions_index, approximate=approximate, topk=topk, outputs=outputs)
+
+    analysis_results = finalize_analysis(partials)
+    if topk:
+        analysis_results['heavy_hitters'] = partials['heavy_hitters']
+    return analysis_results
+
+
+def stream_pipeline(source, chunksize=100_000, kind=None, approximate=False, topk=False, outputs=None):
+    """
+    Run the streaming analysis straight from a workbook or CSV directory
+    """
+    user_details, cooking_sessions = load_lookup_tables(source, kind=kind)
+    return stream_analysis(
+        user_details, cooking_sessions, iter_order_chunks(source, chunksize, kind=kind),
+        approximate=approximate, topk=topk, outputs=outputs
+    )
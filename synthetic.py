@@ -0,0 +1,178 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Catalogue of dishes with their usual meal type and base price (USD)
+DISHES = {
+    'Waffles': ('Breakfast', 9.0),
+    'Pancakes': ('Breakfast', 8.0),
+    'Omelette': ('Breakfast', 7.0),
+    'French Toast': ('Breakfast', 8.5),
+    'Caesar Salad': ('Lunch', 11.0),
+    'Grilled Chicken': ('Lunch', 14.0),
+    'Veggie Burger': ('Lunch', 12.0),
+    'Sandwich': ('Lunch', 9.5),
+    'Spaghetti': ('Dinner', 15.0),
+    'Pasta Alfredo': ('Dinner', 16.0),
+    'Chicken Curry': ('Dinner', 17.0),
+    'Biryani': ('Dinner', 18.0),
+    'Mushroom Risotto': ('Dinner', 19.0),
+    'Fruit Bowl': ('Snack', 6.0),
+    'Brownie': ('Snack', 5.0),
+}
+MEAL_TYPES = ['Breakfast', 'Lunch', 'Dinner', 'Snack']
+LOCATIONS = ['New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix', 'Seattle',
+             'Boston', 'Miami', 'Denver', 'Austin', 'San Francisco', 'Atlanta']
+ORDER_STATUSES = {'Completed': 0.85, 'Canceled': 0.15}
+TIME_OF_DAY = {'Morning': 0.25, 'Afternoon': 0.3, 'Evening': 0.35, 'Night': 0.1}
+
+# Rows per table relative to the number of orders
+SESSIONS_PER_ORDER = 0.6
+USERS_PER_ORDER = 0.05
+# Orders are placed up to this many minutes after their session starts
+ORDER_DELAY_MINUTES = 120
+# Orders drawn from each seeded generator; rows depend on their position, not on chunk sizes
+ORDER_BLOCK = 16_384
+
+
+def _zipf_weights(count, exponent=1.1):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _ids(prefix, numbers, width):
+    return (prefix + pd.Series(numbers).astype(str).str.zfill(width)).to_numpy()
+
+
+def generate_users(n_users, seed=0):
+    """
+    Synthetic UserDetails rows
+    """
+    rng = np.random.default_rng([seed, 0])
+    ages = np.clip(rng.normal(38, 12, n_users).round(), 18, 80)
+    ages[rng.random(n_users) < 0.02] = np.nan
+    registered = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 730, n_users), unit='D')
+    return pd.DataFrame({
+        'User ID': _ids('U', np.arange(1, n_users + 1), 7),
+        'User Name': [f"User {i}" for i in range(1, n_users + 1)],
+        'Age': ages,
+        'Location': rng.choice(LOCATIONS, n_users, p=_zipf_weights(len(LOCATIONS))),
+        'Registration Date': registered,
+        'Phone': rng.integers(2_000_000_000, 9_999_999_999, n_users),
+        'Email': [f"user{i}@example.com" for i in range(1, n_users + 1)],
+        'Favorite Meal': rng.choice(MEAL_TYPES, n_users, p=[0.25, 0.3, 0.35, 0.1]),
+        'Total Orders': rng.poisson(12, n_users) + 1,
+    })
+
+
+def generate_sessions(n_sessions, n_users, seed=0):
+    """
+    Synthetic CookingSessions rows; dish popularity follows a Zipf distribution
+    """
+    rng = np.random.default_rng([seed, 1])
+    dishes = rng.choice(list(DISHES), n_sessions, p=_zipf_weights(len(DISHES), 0.8))
+    meal_types = pd.Series({dish: meal for dish, (meal, _) in DISHES.items()}).reindex(dishes).to_numpy()
+    starts = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24 * 60, n_sessions), unit='min')
+    durations = np.clip(rng.gamma(4, 10, n_sessions).round(), 5, 180)
+    return pd.DataFrame({
+        'Session ID': _ids('S', np.arange(1, n_sessions + 1), 8),
+        'User ID': _ids('U', rng.integers(1, n_users + 1, n_sessions), 7),
+        'Dish Name': dishes,
+        'Meal Type': meal_types,
+        'Session Start': starts,
+        'Session End': starts + pd.to_timedelta(durations, unit='min'),
+        'Duration (mins)': durations,
+        'Session Rating': np.clip(rng.normal(4.2, 0.6, n_sessions), 1, 5).round(1),
+    })
+
+
+def _order_block(block, sessions, seed):
+    """
+    Orders of one fixed-size block, drawn from a generator seeded by the block number
+    """
+    rng = np.random.default_rng([seed, 2, block])
+    picked = rng.integers(0, len(sessions), ORDER_BLOCK)
+    dishes = sessions['Dish Name'].to_numpy()[picked]
+    base_price = pd.Series({dish: price for dish, (_, price) in DISHES.items()}).reindex(dishes).to_numpy()
+    statuses = rng.choice(list(ORDER_STATUSES), ORDER_BLOCK, p=list(ORDER_STATUSES.values()))
+    ratings = rng.choice([1, 2, 3, 4, 5], ORDER_BLOCK, p=[0.03, 0.07, 0.2, 0.35, 0.35]).astype(float)
+    ratings[statuses == 'Canceled'] = np.nan
+    delays = pd.to_timedelta(rng.integers(0, ORDER_DELAY_MINUTES, ORDER_BLOCK), unit='min')
+    first = block * ORDER_BLOCK
+    return pd.DataFrame({
+        'Order ID': np.arange(first + 1, first + ORDER_BLOCK + 1),
+        'User ID': sessions['User ID'].to_numpy()[picked],
+        'Order Date': pd.DatetimeIndex(sessions['Session Start'].to_numpy()[picked]) + delays,
+        'Meal Type': sessions['Meal Type'].to_numpy()[picked],
+        'Dish Name': dishes,
+        'Order Status': statuses,
+        'Amount (USD)': (base_price * rng.uniform(0.9, 1.3, ORDER_BLOCK)).round(2),
+        'Time of Day': rng.choice(list(TIME_OF_DAY), ORDER_BLOCK, p=list(TIME_OF_DAY.values())),
+        'Rating': ratings,
+        'Session ID': sessions['Session ID'].to_numpy()[picked],
+    })
+
+
+def generate_orders(n_orders, sessions, seed=0, start=0):
+    """
+    Synthetic OrderDetails rows `start` to `start + n_orders`, each tied to an existing
+    cooking session. Every row depends only on the seed and its position, so the same
+    orders come out however the range is split into chunks.
+    """
+    end = start + n_orders
+    blocks = range(start // ORDER_BLOCK, max(-(-end // ORDER_BLOCK), start // ORDER_BLOCK + 1))
+    orders = pd.concat([_order_block(block, sessions, seed) for block in blocks], ignore_index=True)
+    offset = start - blocks.start * ORDER_BLOCK
+    return orders.iloc[offset:offset + n_orders].reset_index(drop=True)
+
+
+def table_sizes(n_orders):
+    """
+    Users and sessions generated for a given number of orders
+    """
+    return max(1, int(n_orders * USERS_PER_ORDER)), max(1, int(n_orders * SESSIONS_PER_ORDER))
+
+
+def generate_datasets(n_orders, seed=0):
+    """
+    Deterministic UserDetails, CookingSessions and OrderDetails for `n_orders` orders
+    """
+    n_users, n_sessions = table_sizes(n_orders)
+    users = generate_users(n_users, seed)
+    sessions = generate_sessions(n_sessions, n_users, seed)
+    return users, sessions, generate_orders(n_orders, sessions, seed)
+
+
+def write_csv_dataset(directory, n_orders, seed=0, chunksize=1_000_000):
+    """
+    Write the three datasets as CSV files, generating orders chunk by chunk so
+    100M-row scales never have to fit in memory
+    """
+    from loaders import DATASET_FILES
+
+    os.makedirs(directory, exist_ok=True)
+    n_users, n_sessions = table_sizes(n_orders)
+    sessions = generate_sessions(n_sessions, n_users, seed)
+    generate_users(n_users, seed).to_csv(os.path.join(directory, DATASET_FILES[0]), index=False)
+    sessions.to_csv(os.path.join(directory, DATASET_FILES[1]), index=False)
+
+    orders_path = os.path.join(directory, DATASET_FILES[2])
+    for start in range(0, n_orders, chunksize):
+        chunk = generate_orders(min(chunksize, n_orders - start), sessions, seed, start)
+        chunk.to_csv(orders_path, index=False, mode='w' if start == 0 else 'a', header=start == 0)
+    return directory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic upliance datasets")
+    parser.add_argument('directory', help="Output directory for the three CSV files")
+    parser.add_argument('--orders', type=int, default=10_000, help="Number of order rows")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write_csv_dataset(args.directory, args.orders, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
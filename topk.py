@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+from sketches import CountMin, SpaceSaving, hash_values
+
+# Sketch sizes: Space-Saving counters per ranking and Count-Min table shape
+TOPK_DEFAULTS = {'capacity': 1000, 'width': 4096, 'depth': 4}
+
+# Each ranking as (table, label column, weight column); a weight of None counts rows
+TOPK_RANKINGS = {
+    'dish_revenue': ('session_orders', 'Dish Name_x', 'Amount (USD)'),
+    'dish_orders': ('session_orders', 'Dish Name_x', None),
+    'location_orders': ('user_sessions', 'Location', 'Total Orders'),
+}
+
+
+def topk_options(options):
+    """
+    Sketch settings from True or a dict overriding TOPK_DEFAULTS
+    """
+    return {**TOPK_DEFAULTS, **(options if isinstance(options, dict) else {})}
+
+
+def ranking_columns(table):
+    """
+    Columns of a table the rankings read
+    """
+    columns = []
+    for ranking_table, label_column, weight_column in TOPK_RANKINGS.values():
+        if ranking_table == table:
+            columns += [column for column in (label_column, weight_column) if column and column not in columns]
+    return columns
+
+
+def heavy_hitters(frame, table, options=True):
+    """
+    Space-Saving and Count-Min sketches of every ranking over one table (or chunk, or shard).
+
+    Rows are totalled per label once, so each sketch update touches one entry
+    per distinct label rather than one per row.
+    """
+    options = topk_options(options)
+    sketches = {}
+    for name, (ranking_table, label_column, weight_column) in TOPK_RANKINGS.items():
+        if ranking_table != table or label_column not in frame:
+            continue
+        codes, uniques = pd.factorize(frame[label_column])
+        present = codes >= 0
+        if weight_column is None:
+            weights = np.ones(len(codes))
+        else:
+            weights = frame[weight_column].to_numpy(dtype=float, na_value=0.0)
+        totals = np.bincount(codes[present], weights=weights[present], minlength=len(uniques))
+        labels = pd.Index(np.asarray(uniques, dtype=object))
+        sketches[name] = {
+            'space_saving': SpaceSaving.from_totals(pd.Series(totals, index=labels), options['capacity']),
+            'count_min': CountMin(options['width'], options['depth']).update_hashes(hash_values(labels), totals),
+        }
+    return sketches
+
+
+def merge_heavy_hitters(left, right):
+    """
+    Merge two {ranking: sketches} maps from different chunks or shards
+    """
+    merged = dict(left)
+    for name, sketches in right.items():
+        if name in merged:
+            sketches = {kind: merged[name][kind].merge(sketch) for kind, sketch in sketches.items()}
+        merged[name] = sketches
+    return merged
+
+
+def top_k(sketches, ranking, k=5):
+    """
+    The k largest labels of a ranking with bounds on their totals.
+
+    `estimate` is the tightest upper bound of the two sketches and `lower` a
+    guaranteed lower bound; the two are equal when the total is exact.
+    `guaranteed` marks labels certain to belong to the top k: their lower
+    bound is at least the upper bound of the (k + 1)-th label and of any
+    label the sketch does not track.
+    """
+    space_saving = sketches[ranking]['space_saving']
+    count_min = sketches[ranking]['count_min']
+    counters = space_saving.counters
+    labels = pd.Index(counters.index)
+    upper = np.minimum(counters['count'].to_numpy(), count_min.estimate_hashes(hash_values(labels.astype(object))))
+    lower = (counters['count'] - counters['error']).to_numpy()
+    table = pd.DataFrame({'estimate': upper, 'lower': np.minimum(lower, upper)}, index=labels)
+    table['error'] = table['estimate'] - table['lower']
+    table = table.sort_values(['estimate', 'lower'], ascending=False, kind='stable')
+
+    runner_up = table['estimate'].iloc[k] if len(table) > k else 0.0
+    table['guaranteed'] = table['lower'] >= max(runner_up, space_saving.floor)
+    table = table.head(k)
+    table.index.name = TOPK_RANKINGS[ranking][1]
+    return table
@@ -1,21 +1,119 @@
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from aggregates import (
+    DURATION_BIN_WIDTH,
+    RATING_BIN_EDGES,
+    SESSION_SECTIONS,
+    aggregate_sections,
+    finalize_analysis,
+)
+from graph import CONSUMERS
+from profiling import profiled
+from rollups import revenue_rollups
+from topk import top_k
+
+# Above this many sessions, scatter plots switch to a bounded rendering mode
+SCATTER_ROW_LIMIT = 50_000
+# Duration x rating grid used by the density rendering
+DENSITY_BINS = (60, 40)
+
+def _scatter_render_mode(n_rows, render):
+    """
+    Pick 'scatter', 'density' or 'webgl' for a session scatter plot
+    """
+    if render != 'auto':
+        return render
+    return 'scatter' if n_rows <= SCATTER_ROW_LIMIT else 'density'
+
+def _stratified_sample(user_sessions, max_points, by='Age_Group'):
+    """
+    Downsample sessions to about max_points rows, keeping each group's share
+    """
+    if len(user_sessions) <= max_points:
+        return user_sessions
+    fraction = max_points / len(user_sessions)
+    return user_sessions.groupby(by, observed=True, group_keys=False).sample(frac=fraction, random_state=0)
+
+# analysis_results sections the customer insights dashboard is drawn from
+CUSTOMER_SECTIONS = CONSUMERS['visualize_customer_insights']
+
+def _bubble_trace(name, x, y, counts, largest):
+    """
+    One marker per non-empty density cell, sized by its share of the largest cell
+    """
+    return go.Scatter(
+        x=x,
+        y=y,
+        mode='markers',
+        name=name,
+        marker=dict(size=4 + 26 * np.sqrt(counts / largest), opacity=0.6),
+        customdata=counts,
+        hovertemplate='Duration: %{x:.0f} min<br>Rating: %{y:.1f}<br>Sessions: %{customdata:,.0f}'
+    )
+
+def _density_traces(user_sessions, by=None, bins=DENSITY_BINS):
+    """
+    Bin Duration x Session Rating on the server and draw each non-empty cell as
+    a marker sized by its count, one trace per group when `by` is given; no traces
+    when there are no sessions to bin
+    """
+    data = user_sessions[['Duration (mins)', 'Session Rating']].dropna()
+    if data.empty:
+        return []
+    groups = user_sessions.loc[data.index, by] if by else None
+    duration_edges = np.histogram_bin_edges(data['Duration (mins)'], bins=bins[0])
+    rating_edges = np.histogram_bin_edges(data['Session Rating'], bins=bins[1])
+    duration_centres = (duration_edges[:-1] + duration_edges[1:]) / 2
+    rating_centres = (rating_edges[:-1] + rating_edges[1:]) / 2
+
+    grids = []
+    if by:
+        for name, index in data.groupby(groups, observed=True).groups.items():
+            grids.append((str(name), data.loc[index]))
+    else:
+        grids.append(('Sessions', data))
+
+    counts = [
+        np.histogram2d(rows['Duration (mins)'], rows['Session Rating'], bins=[duration_edges, rating_edges])[0]
+        for _, rows in grids
+    ]
+    largest = max((grid.max() for grid in counts), default=1) or 1
+
+    traces = []
+    for (name, _), grid in zip(grids, counts):
+        x_index, y_index = np.nonzero(grid)
+        traces.append(_bubble_trace(
+            name, duration_centres[x_index], rating_centres[y_index], grid[x_index, y_index], largest
+        ))
+    return traces
+
+def customer_distributions(user_sessions):
+    """
+    The pre-aggregated CUSTOMER_SECTIONS of analysis_results, computed from user_sessions
+    """
+    sections = {section: SESSION_SECTIONS[section] for section in CUSTOMER_SECTIONS}
+    return finalize_analysis(aggregate_sections(user_sessions, sections))
+
+@profiled('figure.plot_order_performance')
 def plot_order_performance(order_analysis):
     """
     Create bar chart showing order performance by status
     """
+    # Drawn from a frame so an empty order_analysis (no matching orders) gives an empty chart
+    counts = order_analysis[('Order ID', 'count')].rename_axis('Order Status').rename('Number of Orders').reset_index()
     fig = px.bar(
-        order_analysis.reset_index(), 
-        x='Order Status', 
-        y=('Order ID', 'count'), 
+        counts,
+        x='Order Status',
+        y='Number of Orders',
         color='Order Status',
-        title='Order Performance by Status',
-        labels={'y': 'Number of Orders'}
+        title='Order Performance by Status'
     )
     return fig
 
+@profiled('figure.plot_age_demographics')
 def plot_age_demographics(age_analysis):
     """
     Create pie chart showing user age demographics
@@ -28,40 +126,64 @@ def plot_age_demographics(age_analysis):
     )
     return fig
 
-def plot_top_dishes(dish_analysis):
+@profiled('figure.plot_top_dishes')
+def plot_top_dishes(dish_analysis, heavy_hitters=None):
     """
-    Create bar chart showing top 5 dishes by revenue
+    Create bar chart showing top 5 dishes by revenue.
+    Pass the 'heavy_hitters' sketches of a streaming or parallel run (with
+    dish_analysis=None) to rank dishes without a full per-dish table.
     """
-    top_5_dishes = dish_analysis.nlargest(5, ('Amount (USD)', 'sum'))
+    if heavy_hitters is not None:
+        revenue = top_k(heavy_hitters, 'dish_revenue', 5)['estimate']
+    else:
+        revenue = dish_analysis[('Amount (USD)', 'sum')].nlargest(5)
+    revenue = revenue.rename_axis('Dish Name').rename('Revenue (USD)').reset_index()
     fig = px.bar(
-        x=top_5_dishes.index,
-        y=top_5_dishes[('Amount (USD)', 'sum')],
-        title='Top 5 Dishes by Revenue',
-        labels={'x': 'Dish Name', 'y': 'Revenue (USD)'}
+        revenue,
+        x='Dish Name',
+        y='Revenue (USD)',
+        title='Top 5 Dishes by Revenue'
     )
     fig.update_traces(texttemplate='%{y:.2f}', textposition='auto')
     fig.update_layout(height=500)
     return fig
 
-def plot_duration_vs_rating(user_sessions):
+@profiled('figure.plot_duration_vs_rating')
+def plot_duration_vs_rating(user_sessions, render='auto', max_points=SCATTER_ROW_LIMIT):
     """
-    Create scatter plot showing relationship between session duration and rating
+    Create scatter plot showing relationship between session duration and rating.
+    render='auto' draws every session up to SCATTER_ROW_LIMIT rows and a binned
+    density per age group beyond that; 'webgl' draws a stratified sample of
+    max_points sessions with WebGL instead.
     """
-    fig = px.scatter(
-        user_sessions,
-        x='Duration (mins)',
-        y='Session Rating',
-        color='Age_Group',
-        title='Session Duration vs Rating by Age Group',
-        labels={
-            'Duration (mins)': 'Session Duration (minutes)',
-            'Session Rating': 'Rating',
-            'Age_Group': 'Age Group'
-        }
-    )
+    mode = _scatter_render_mode(len(user_sessions), render)
+    labels = {
+        'Duration (mins)': 'Session Duration (minutes)',
+        'Session Rating': 'Rating',
+        'Age_Group': 'Age Group'
+    }
+    if mode == 'density':
+        fig = go.Figure(_density_traces(user_sessions, by='Age_Group'))
+        fig.update_layout(
+            title='Session Duration vs Rating by Age Group',
+            xaxis_title=labels['Duration (mins)'],
+            yaxis_title=labels['Session Rating'],
+            legend_title_text=labels['Age_Group']
+        )
+    else:
+        fig = px.scatter(
+            _stratified_sample(user_sessions, max_points) if mode == 'webgl' else user_sessions,
+            x='Duration (mins)',
+            y='Session Rating',
+            color='Age_Group',
+            title='Session Duration vs Rating by Age Group',
+            labels=labels,
+            render_mode='webgl' if mode == 'webgl' else 'auto'
+        )
     fig.update_layout(height=500)
     return fig
 
+@profiled('figure.visualize_revenue_patterns')
 def visualize_revenue_patterns(analysis_results):
     """
     Create subplot with revenue patterns
@@ -99,14 +221,23 @@ def visualize_revenue_patterns(analysis_results):
     fig.update_layout(height=500, title_text="Revenue Patterns")
     return fig
 
-def visualize_customer_insights(user_sessions):
+@profiled('figure.visualize_customer_insights')
+def visualize_customer_insights(data, render='auto', max_points=SCATTER_ROW_LIMIT):
     """
-    Create comprehensive customer insights dashboard
+    Create comprehensive customer insights dashboard.
+
+    `data` is analysis_results (every panel is drawn from its pre-binned counts
+    and group means) or user_sessions, which is aggregated the same way first;
+    only the duration vs rating panel of a user_sessions frame may draw raw
+    points, controlled by `render` and `max_points` as in plot_duration_vs_rating.
     """
+    user_sessions = None if isinstance(data, dict) else data
+    results = data if user_sessions is None else customer_distributions(user_sessions)
+
     fig = make_subplots(
         rows=2, cols=2,
         specs=[[{"type": "pie"}, {"type": "bar"}],
-               [{"type": "histogram"}, {"type": "xy"}]],
+               [{"type": "xy"}, {"type": "xy"}]],
         subplot_titles=(
             'Age Group Distribution',
             'Average Session Duration by Age',
@@ -116,36 +247,171 @@ def visualize_customer_insights(user_sessions):
     )
     
     # Age Distribution
-    age_counts = user_sessions['Age_Group'].value_counts()
+    age_data = results['age_analysis']
     fig.add_trace(
-        go.Pie(labels=age_counts.index, values=age_counts.values, name='Age Groups'),
+        go.Pie(labels=age_data.index, values=age_data['User ID'], name='Age Groups'),
         row=1, col=1
     )
     
     # Average Duration by Age
-    avg_duration = user_sessions.groupby('Age_Group')['Duration (mins)'].mean()
     fig.add_trace(
-        go.Bar(x=avg_duration.index, y=avg_duration.values, name='Avg Duration'),
+        go.Bar(x=age_data.index, y=age_data['Duration (mins)'], name='Avg Duration'),
         row=1, col=2
     )
     
     # Rating Distribution
+    rating_data = results['rating_distribution']
+    bin_width = RATING_BIN_EDGES[1] - RATING_BIN_EDGES[0]
     fig.add_trace(
-        go.Histogram(x=user_sessions['Session Rating'], nbinsx=10, name='Ratings'),
+        go.Bar(
+            x=rating_data.index + bin_width / 2,
+            y=rating_data['Session Rating'],
+            width=bin_width,
+            name='Ratings'
+        ),
         row=2, col=1
     )
     
     # Duration vs Rating
-    fig.add_trace(
-        go.Scatter(
-            x=user_sessions['Duration (mins)'],
-            y=user_sessions['Session Rating'],
+    mode = 'density' if user_sessions is None else _scatter_render_mode(len(user_sessions), render)
+    if mode == 'density':
+        grid = results['duration_rating_distribution']['Session Rating']
+        counts = grid.to_numpy()
+        scatter_traces = [_bubble_trace(
+            'Duration vs Rating',
+            grid.index.get_level_values('Duration_Bin') + DURATION_BIN_WIDTH / 2,
+            grid.index.get_level_values('Rating_Bin') + bin_width / 2,
+            counts,
+            counts.max() if len(counts) else 1
+        )]
+    else:
+        sample = _stratified_sample(user_sessions, max_points) if mode == 'webgl' else user_sessions
+        trace_type = go.Scattergl if mode == 'webgl' else go.Scatter
+        scatter_traces = [trace_type(
+            x=sample['Duration (mins)'],
+            y=sample['Session Rating'],
             mode='markers',
             name='Duration vs Rating',
             opacity=0.6
+        )]
+    for trace in scatter_traces:
+        fig.add_trace(trace, row=2, col=2)
+    
+    fig.update_layout(height=800, title_text="Customer Behavior Insights")
+    return fig
+
+@profiled('figure.visualize_menu_performance')
+def visualize_menu_performance(analysis_results):
+    """
+    Create menu performance dashboard from the dish, meal and time sections of analysis_results
+    """
+    fig = make_subplots(
+        rows=2, cols=2,
+        subplot_titles=(
+            'Top 5 Dishes by Revenue',
+            'Rating Distribution by Meal Type',
+            'Average Order Value by Meal Type',
+            'Order Volume by Time of Day'
+        )
+    )
+    
+    # Top Dishes
+    top_dishes = analysis_results['dish_analysis'].nlargest(5, ('Amount (USD)', 'sum'))
+    fig.add_trace(
+        go.Bar(
+            x=top_dishes[('Amount (USD)', 'sum')],
+            y=top_dishes.index,
+            orientation='h',
+            name='Revenue'
+        ),
+        row=1, col=1
+    )
+    
+    # Ratings by Meal Type
+    meal_data = analysis_results['meal_analysis']
+    fig.add_trace(
+        go.Bar(x=meal_data.index, y=meal_data[('Rating', 'mean')], name='Avg Rating'),
+        row=1, col=2
+    )
+    
+    # Average Order Value
+    fig.add_trace(
+        go.Bar(x=meal_data.index, y=meal_data[('Amount (USD)', 'mean')], name='Avg Order Value'),
+        row=2, col=1
+    )
+    
+    # Order Volume by Time
+    time_data = analysis_results['time_analysis']
+    fig.add_trace(
+        go.Scatter(
+            x=time_data.index,
+            y=time_data[('Order ID', 'count')],
+            mode='lines+markers',
+            name='Order Volume'
         ),
         row=2, col=2
     )
     
-    fig.update_layout(height=800, title_text="Customer Behavior Insights")
+    fig.update_layout(height=1000, title_text="Menu Performance Analysis")
+    return fig
+
+@profiled('figure.visualize_location_performance')
+def visualize_location_performance(analysis_results):
+    """
+    Create location performance dashboard from the location_metrics section of analysis_results
+    """
+    location_metrics = analysis_results['location_metrics']
+    fig = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=(
+            'Orders and Ratings by Location',
+            'Average Orders per User by Location'
+        ),
+        specs=[[{"secondary_y": True}], [{"secondary_y": False}]]
+    )
+    
+    # Orders and Ratings
+    fig.add_trace(
+        go.Bar(x=location_metrics.index, y=location_metrics[('Total Orders', 'sum')], name='Total Orders'),
+        row=1, col=1
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=location_metrics.index,
+            y=location_metrics[('Session Rating', 'mean')],
+            name='Avg Rating',
+            mode='lines+markers'
+        ),
+        row=1, col=1,
+        secondary_y=True
+    )
+    
+    # Average Orders per User
+    fig.add_trace(
+        go.Bar(x=location_metrics.index, y=location_metrics[('Total Orders', 'mean')], name='Avg Orders/User'),
+        row=2, col=1
+    )
+    
+    fig.update_layout(height=800, title_text="Location Performance Analysis")
+    return fig
+
+@profiled('figure.plot_revenue_trend')
+def plot_revenue_trend(analysis_results, level='daily'):
+    """
+    Create revenue and order volume trend from the pre-aggregated rollup at `level`
+    (hourly, daily, weekly or monthly)
+    """
+    trend = revenue_rollups(analysis_results, levels=(level,))[level]
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(
+        go.Scatter(x=trend.index, y=trend['revenue'], mode='lines', name='Revenue'),
+        secondary_y=False
+    )
+    fig.add_trace(
+        go.Bar(x=trend.index, y=trend['orders'], name='Orders', opacity=0.4),
+        secondary_y=True
+    )
+    fig.update_yaxes(title_text='Revenue (USD)', secondary_y=False)
+    fig.update_yaxes(title_text='Orders', secondary_y=True)
+    fig.update_layout(height=500, title_text=f"{level.capitalize()} Revenue Trend")
     return fig
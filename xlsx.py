@@ -0,0 +1,352 @@
+import importlib.util
+import io
+import multiprocessing
+import os
+import posixpath
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from xml.etree.ElementTree import iterparse
+
+import pandas as pd
+
+# Rows per batch when streaming a sheet
+SHEET_BATCH_ROWS = 100_000
+
+# Strings pd.read_excel reads as missing, so both readers agree
+try:
+    from pandas._libs.parsers import STR_NA_VALUES as NA_STRINGS
+except ImportError:
+    NA_STRINGS = frozenset(('', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+                            '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'))
+
+RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# Workbook opened by read_sheets, inherited by forked sheet workers
+_forked_book = None
+
+
+def _local(tag):
+    return tag.rpartition('}')[2]
+
+
+def _archive(source):
+    return zipfile.ZipFile(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+
+
+def _texts(element):
+    """
+    Text of a shared or inline string: its <t>, or its rich-text runs joined (phonetic runs skipped)
+    """
+    parts = []
+    for child in element:
+        name = _local(child.tag)
+        if name == 't':
+            parts.append(child.text or '')
+        elif name == 'r':
+            parts.extend(grandchild.text or '' for grandchild in child if _local(grandchild.tag) == 't')
+    return ''.join(parts)
+
+
+def _shared_strings(archive):
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as handle:
+        for _, element in iterparse(handle):
+            if _local(element.tag) == 'si':
+                strings.append(_texts(element))
+                element.clear()
+    return strings
+
+
+def _date_styles(archive):
+    """
+    Positions of the cell styles whose number format shows a date or time
+    """
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+    if 'xl/styles.xml' not in archive.namelist():
+        return frozenset()
+    formats = dict(BUILTIN_FORMATS)
+    styles = []
+    with archive.open('xl/styles.xml') as handle:
+        for _, element in iterparse(handle):
+            name = _local(element.tag)
+            if name == 'numFmt':
+                formats[int(element.get('numFmtId'))] = element.get('formatCode')
+            elif name == 'cellXfs':
+                styles = [int(xf.get('numFmtId', 0)) for xf in element if _local(xf.tag) == 'xf']
+    return frozenset(position for position, format_id in enumerate(styles)
+                     if formats.get(format_id) and is_date_format(formats[format_id]))
+
+
+def _sheet_parts(archive):
+    """
+    Sheet name -> worksheet part inside the archive, and whether the workbook uses the 1904 epoch
+    """
+    targets = {}
+    with archive.open('xl/_rels/workbook.xml.rels') as handle:
+        for _, element in iterparse(handle):
+            if _local(element.tag) == 'Relationship':
+                target = element.get('Target')
+                targets[element.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+    parts = {}
+    date1904 = False
+    with archive.open('xl/workbook.xml') as handle:
+        for _, element in iterparse(handle):
+            name = _local(element.tag)
+            if name == 'sheet':
+                parts[element.get('name')] = targets[element.get(f'{{{RELATIONSHIPS_NS}}}id')]
+            elif name == 'workbookPr':
+                date1904 = element.get('date1904') in ('1', 'true')
+    return parts, date1904
+
+
+def open_workbook(source):
+    """
+    Everything shared by the sheets of an .xlsx workbook (path or bytes), read once:
+    sheet locations, the shared-strings table and the date cell styles
+    """
+    with _archive(source) as archive:
+        parts, date1904 = _sheet_parts(archive)
+        return {
+            'source': source,
+            'sheets': parts,
+            'strings': _shared_strings(archive),
+            'date_styles': _date_styles(archive),
+            'date1904': date1904,
+        }
+
+
+def _column_number(reference, columns):
+    """
+    Zero-based column of a cell reference such as 'AB12', memoised per column letters
+    """
+    letters = reference.rstrip('0123456789')
+    if letters not in columns:
+        number = 0
+        for character in letters:
+            number = number * 26 + ord(character) - 64
+        columns[letters] = number - 1
+    return columns[letters]
+
+
+def _number(text):
+    return float(text) if '.' in text or 'E' in text or 'e' in text else int(text)
+
+
+def _cell_value(cell, book, tags, from_excel, epoch):
+    """
+    Python value of a <c> element, as openpyxl (and so pd.read_excel) would give it
+    """
+    kind = cell.get('t', 'n')
+    if kind == 'inlineStr':
+        value = next((_texts(child) for child in cell if child.tag == tags['is']), None)
+    else:
+        raw = next((child.text for child in cell if child.tag == tags['v']), None)
+        if raw is None:
+            return None
+        if kind == 's':
+            value = book['strings'][int(raw)]
+        elif kind == 'n':
+            value = _number(raw)
+            style = cell.get('s')
+            if style is not None and int(style) in book['date_styles']:
+                value = from_excel(value, epoch)
+            return value
+        elif kind == 'b':
+            return raw == '1'
+        elif kind == 'd':
+            return pd.Timestamp(raw).to_pydatetime()
+        else:
+            value = raw
+    return None if value is None or value in NA_STRINGS else value
+
+
+def iter_rows(book, sheet):
+    """
+    Yield the rows of a sheet as lists of cell values, streaming its XML.
+
+    Rows the sheet skips come back empty, as pd.read_excel keeps them, and each
+    parsed row is dropped from the tree straight away, so memory stays flat.
+    """
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+    epoch = CALENDAR_MAC_1904 if book['date1904'] else CALENDAR_WINDOWS_1900
+    if sheet not in book['sheets']:
+        raise ValueError(f"Worksheet named '{sheet}' not found")
+    with _archive(book['source']) as archive, archive.open(book['sheets'][sheet]) as handle:
+        tags = None
+        parent = None
+        columns = {}
+        expected = 1
+        for event, element in iterparse(handle, events=('start', 'end')):
+            if event == 'start':
+                if tags is None:
+                    # Qualified tag names, taken from the namespace of the <worksheet> root
+                    namespace = element.tag[:element.tag.index('}') + 1] if element.tag.startswith('{') else ''
+                    tags = {name: namespace + name for name in ('sheetData', 'row', 'is', 'v')}
+                elif parent is None and element.tag == tags['sheetData']:
+                    parent = element
+                continue
+            if element.tag != tags['row']:
+                continue
+            number = int(element.get('r', expected))
+            for _ in range(expected, number):
+                yield []
+            expected = number + 1
+            values = []
+            for cell in element:
+                reference = cell.get('r')
+                position = _column_number(reference, columns) if reference else len(values)
+                if position > len(values):
+                    values.extend([None] * (position - len(values)))
+                values.append(_cell_value(cell, book, tags, from_excel, epoch))
+            yield values
+            element.clear()
+            if parent is not None:
+                parent.remove(element)
+
+
+def _typed_column(values):
+    """
+    One column buffer as a Series; text columns that are all numbers become numeric,
+    as pd.read_excel's parser converts them
+    """
+    column = pd.Series(values)
+    if column.dtype == object or pd.api.types.is_string_dtype(column):
+        present = column.dropna()
+        if len(present) and all(isinstance(value, str) for value in present):
+            try:
+                return pd.to_numeric(column)
+            except (ValueError, TypeError):
+                pass
+    return column
+
+
+def _batch_frame(columns, buffers):
+    return pd.DataFrame(dict(zip(columns, map(_typed_column, buffers))), columns=columns)
+
+
+def iter_sheet_batches(book, sheet, batch_size=SHEET_BATCH_ROWS):
+    """
+    Yield a sheet as DataFrames of at most `batch_size` rows, the first row being the header.
+
+    Cells go straight into one buffer per column, typed once per batch, so only
+    one batch of the sheet is ever held as Python objects. Trailing empty rows are
+    dropped as pd.read_excel drops them.
+    """
+    rows = iter_rows(book, sheet)
+    header = next(rows, [])
+    while header and header[-1] is None:
+        header.pop()
+    columns = [f"Unnamed: {position}" if name is None else name for position, name in enumerate(header)]
+    width = len(columns)
+    if not width:
+        yield pd.DataFrame()
+        return
+    buffers = [[] for _ in columns]
+    empty = 0
+    yielded = False
+    for values in rows:
+        if not any(value is not None for value in values[:width]):
+            # Held back until a later row shows they are not trailing
+            empty += 1
+            continue
+        for _ in range(empty):
+            for buffer in buffers:
+                buffer.append(None)
+        empty = 0
+        values = values + [None] * (width - len(values)) if len(values) < width else values
+        for buffer, value in zip(buffers, values):
+            buffer.append(value)
+        if len(buffers[0]) >= batch_size:
+            yield _batch_frame(columns, buffers)
+            buffers = [[] for _ in columns]
+            yielded = True
+    if buffers[0] or not yielded:
+        yield _batch_frame(columns, buffers)
+
+
+def read_sheet(book, sheet):
+    """
+    One whole sheet as a DataFrame, parsed batch by batch
+    """
+    batches = list(iter_sheet_batches(book, sheet))
+    if len(batches) == 1:
+        return batches[0]
+    frame = pd.concat(batches, ignore_index=True)
+    # Batches that held only missing values in a column can leave it as object
+    return frame.infer_objects() if any(dtype == object for dtype in frame.dtypes) else frame
+
+
+def _read_forked_sheet(sheet, directory):
+    """
+    Worker: parse one sheet and write it as an Arrow IPC file, returning its path,
+    so the sheet is not pickled back and held twice in the parent
+    """
+    from pyarrow import feather
+
+    frame = read_sheet(_forked_book, sheet)
+    path = os.path.join(directory, f"{_forked_book['sheets'][sheet].replace('/', '_')}.arrow")
+    try:
+        feather.write_feather(frame, path, compression='uncompressed')
+    except (ValueError, TypeError):
+        # Columns mixing types have no Arrow type; such a sheet comes back pickled
+        return frame
+    return path
+
+
+def _can_fork():
+    """
+    Whether sheet workers can be forked safely: the platform forks, this process
+    runs no other threads (forking a threaded process can deadlock) and pyarrow
+    is there to hand the sheets back
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods() or threading.active_count() > 1:
+        return False
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def read_sheets(source, sheets, workers=None):
+    """
+    Several sheets of one workbook, parsed concurrently after opening it once.
+
+    The shared strings and styles are read once in this process. Where it is safe
+    to fork (see _can_fork), each sheet is parsed in its own process that inherits
+    them and writes the sheet to a temporary Arrow file, which is then read back
+    memory-mapped; otherwise the sheets are parsed on threads.
+    """
+    global _forked_book
+
+    book = open_workbook(source)
+    sheets = list(sheets)
+    workers = min(workers or len(sheets), len(sheets)) or 1
+    if workers == 1:
+        return tuple(read_sheet(book, sheet) for sheet in sheets)
+    if _can_fork():
+        from pyarrow import feather
+
+        _forked_book = book
+        try:
+            context = multiprocessing.get_context('fork')
+            with tempfile.TemporaryDirectory() as directory:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    results = list(pool.map(_read_forked_sheet, sheets, [directory] * len(sheets)))
+                return tuple(
+                    feather.read_table(result, memory_map=True).to_pandas() if isinstance(result, str) else result
+                    for result in results
+                )
+        finally:
+            _forked_book = None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return tuple(pool.map(lambda sheet: read_sheet(book, sheet), sheets))
+
+
+def is_xlsx(source):
+    """
+    Whether a workbook (path or bytes) is an Office Open XML (zip) file this reader handles
+    """
+    return zipfile.is_zipfile(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)